@@ -1,13 +1,13 @@
-from json import dump
+import asyncio
 from os import mkdir
 from os.path import exists
 from pathlib import Path
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 
 from config import available_languages, sample_logger, domain
-from resources import category, attribute, product_type, product, language, user, payment, order, settings
+from helpers.static import MediaStaticFiles
+from resources import category, attribute, product_type, product, language, user, payment, order, settings, image
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI()
@@ -27,6 +27,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # Routers
@@ -39,6 +40,7 @@ app.include_router(user.router)
 app.include_router(payment.router)
 app.include_router(order.router)
 app.include_router(settings.router)
+app.include_router(image.router)
 
 
 # app.state.languages = AppLanguage(prefixes=available_languages)
@@ -62,17 +64,22 @@ async def create_dirs():
 
 @app.on_event("startup")
 async def startup_event():
-    from models.language import Language
+    from models.indexes import ensure_indexes
+    ensure_indexes()
+
+    from models.language import Language, TranslationModel
     for lang in available_languages:
-        db_lang = Language.get_language(lang)
-        if not db_lang:
+        if not Language.get_language(lang):
             new_lang = Language(prefix=lang)
             new_lang.save()
-            with open(f'languages/{lang}.json', 'w'):
-                pass
-        else:
-            with open(f'languages/{db_lang.prefix}.json', 'w') as outfile:
-                dump(db_lang.strings, outfile, sort_keys=True, indent=4)
+    TranslationModel.migrate()
+    TranslationModel.load()
+    # Referenced so the sync task isn't garbage collected while it sleeps
+    app.state.translation_sync = asyncio.create_task(TranslationModel.sync())
+
+    from models.media import MediaModel
+    MediaModel.migrate()
+    app.state.media_gc = asyncio.create_task(MediaModel.collect_periodically())
     await create_dirs()
 
     from models.settings import SettingsModel
@@ -114,12 +121,11 @@ if not exists('./logs'):
     Path('./logs/error.log').touch()
 
 # Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", MediaStaticFiles(directory="static"), name="static")
 
 if __name__ == "__main__":
     # import uvicorn
     # uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True, workers=2)
-    import asyncio
     import uvicorn
 
     # LOGGING_CONFIG["formatters"]["default"]["fmt"] = "%(asctime)s [%(name)s] %(levelprefix)s %(message)s"
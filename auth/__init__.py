@@ -1,11 +1,17 @@
+import logging
+from asyncio import get_running_loop
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime
 from typing import Optional, List
 
+from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
 
+from config import password_hash_workers, password_hash_max_pending, password_hash_warn_pending
+
 SECRET_KEY = "XXXX"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 43800
@@ -27,6 +33,46 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+# bcrypt takes 100-300 ms of CPU per call, so it runs on its own bounded pool instead of the event loop
+password_pool = ThreadPoolExecutor(max_workers=password_hash_workers, thread_name_prefix='password')
+pending_password_jobs = 0
+
+logger = logging.getLogger(__name__)
+
+
+def password_queue_depth() -> int:
+    """Hashing jobs queued or running on the pool."""
+    return pending_password_jobs
+
+
+async def run_password_job(function, *args):
+    global pending_password_jobs
+    if password_queue_depth() >= password_hash_max_pending:
+        logger.warning('Password hashing queue full (%d jobs), answering 503', password_queue_depth())
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many requests, please try again.",
+            headers={"Retry-After": "1"},
+        )
+    pending_password_jobs += 1
+    if password_queue_depth() == password_hash_warn_pending:
+        # Logged when the depth crosses the threshold, not for every job above it
+        logger.warning('Password hashing queue at %d of %d jobs', password_hash_warn_pending,
+                       password_hash_max_pending)
+    try:
+        return await get_running_loop().run_in_executor(password_pool, function, *args)
+    finally:
+        pending_password_jobs -= 1
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await run_password_job(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    return await run_password_job(get_password_hash, password)
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
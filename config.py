@@ -92,3 +92,79 @@ sample_logger = {
         },
     },
 }
+
+# Catalog cache
+catalog_cache_ttl = 300
+catalog_cache_max_entries = 512
+
+# Authenticated users cache, a role / password change on another worker applies after at most the ttl
+principal_cache_ttl = 60
+principal_cache_max_entries = 4096
+
+# Sequences, numbers reserved per worker in each round trip (1 keeps them contiguous)
+order_number_block_size = 1
+invoice_number_block_size = 1
+
+# Password hashing pool, logins beyond max pending are answered with 503 instead of queueing forever,
+# a queue reaching warn pending is logged
+password_hash_workers = 4
+password_hash_max_pending = 64
+password_hash_warn_pending = 32
+
+# Translations, every worker polls the translations collection for versions newer than the ones it holds.
+# The overlap re-reads the last versions in case a write with a lower version landed after a higher one.
+translation_sync_interval = 5
+translation_sync_overlap = 500
+
+# Image processing pool (processes, PIL holds the GIL while resizing)
+image_workers = 2
+# Extra formats written next to every variant (skipped when the Pillow build can't encode them)
+image_formats = {
+    'avif': {'quality': 50, 'speed': 6},
+    'webp': {'quality': 80, 'method': 6},
+}
+# Drops EXIF / XMP from the generated variants
+image_strip_metadata = True
+
+# Variants generated on upload (size: suffix), the frontend can use /images/resize for the other widths instead
+image_sizes = {
+    '400': '1x',
+    '800': '2x',
+    '1200': '3x',
+    '1600': '4x'
+}
+# On demand variants (/images/resize), kept on disk and evicted least recently used first above max bytes
+image_cache_dir = './cache/images'
+image_cache_max_bytes = 512 * 1024 * 1024
+image_max_width = 3200
+image_default_quality = 80
+# The widths and qualities asked are snapped to these, so the combinations (jobs, cache entries) stay few
+image_resize_widths = (160, 320, 480, 640, 800, 1024, 1280, 1600, 2048, 2400, 3200)
+image_resize_qualities = (50, 65, 80, 90)
+# Resizes running or queued on the image pool, new ones beyond it are answered with 503
+image_resize_max_pending = 32
+
+# Uploads, streamed to disk as the body arrives and rejected as soon as they go over the limit,
+# the Content-Length may exceed it by the multipart framing
+upload_form_overhead = 64 * 1024
+upload_max_image_bytes = 20 * 1024 * 1024
+upload_max_video_bytes = 500 * 1024 * 1024
+
+# Content addressed media (static/media), unreferenced blobs older than the grace period are garbage collected
+media_dir = 'static/media'
+media_gc_grace_hours = 24
+media_gc_interval_hours = 6
+
+# Static files, paths under these prefixes only change with their content and are cached forever
+static_immutable_prefixes = ('media/', 'settings/')
+static_max_age = 86400
+# Extensions stored with .br / .gz siblings, served when the client accepts the encoding
+static_compressible = ('svg', 'json', 'css', 'js', 'txt', 'xml', 'html')
+
+# Invoice rendering pool (processes, WeasyPrint is CPU bound)
+invoice_workers = 2
+# An invoice queued longer than this without a job in the worker asked lost it in a restart, it's reported failed
+invoice_job_timeout_minutes = 15
+
+# Compiled Jinja templates (invoices and emails)
+template_cache_dir = './cache/templates'
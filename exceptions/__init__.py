@@ -94,3 +94,23 @@ class PaymentNotFound(Error):
 class CartEmpty(Error):
     code = 'cart_empty'
     msg_template = "Can't create order with an empty cart."
+
+
+class ProductOutOfStock(Error):
+    code = 'product_out_of_stock'
+    msg_template = "The product '{}' doesn't have enough stock."
+
+
+class UploadTooLarge(Error):
+    code = 'upload_too_large'
+    msg_template = "The file is larger than the {} MB limit."
+
+
+class InvalidUpload(Error):
+    code = 'invalid_upload'
+    msg_template = "The request has no '{}' file."
+
+
+class InvalidCursor(Error):
+    code = 'invalid_cursor'
+    msg_template = "The cursor '{}' is not valid."
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from threading import RLock
+from time import monotonic
+from typing import Any, Callable, Hashable, Awaitable, Iterable
+
+from config import catalog_cache_ttl, catalog_cache_max_entries
+
+
+class TTLCache:
+    """
+    Small in-process LRU cache with a time to live per entry.
+    It is only guarded by a lock because mongoengine signals can fire from the executor threads.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = RLock()
+        # Bumped on every invalidation, so a load that started before it doesn't store stale data
+        self.generation = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value, generation: int = None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        value = self.get(key)
+        if value is None:
+            generation = self.generation
+            value = await loader()
+            # Nothing found isn't cached
+            if value is not None:
+                self.set(key, value, generation)
+        return value
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]):
+        with self._lock:
+            self.generation += 1
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def invalidate_items(self, predicate: Callable[[Hashable, Any], bool]):
+        with self._lock:
+            self.generation += 1
+            for key in [k for k, (_, v) in self._entries.items() if predicate(k, v)]:
+                del self._entries[key]
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Catalog cache, keys are tuples starting with the collection name, e.g. ('products', category)
+catalog_cache = TTLCache(catalog_cache_ttl, catalog_cache_max_entries)
+
+# Which cached collections embed data from another one
+# (products nest the product type, product types nest the attributes, categories count the products)
+catalog_dependencies = {
+    'attributes': ('attributes', 'product_types', 'products'),
+    'product_types': ('product_types', 'products'),
+    'categories': ('categories', 'products'),
+    'products': ('products', 'categories'),
+}
+
+
+def invalidate_catalog(collections: Iterable[str]):
+    affected = set()
+    for collection in collections:
+        affected.update(catalog_dependencies.get(collection, ()))
+    if affected:
+        catalog_cache.invalidate(lambda key: key[0] in affected)
+
+
+def invalidate_model(model):
+    invalidate_catalog([model._get_collection_name()])
+
+
+def invalidate_on_change(sender, document, **kwargs):
+    """mongoengine post_save / post_delete receiver."""
+    invalidate_model(sender)
@@ -0,0 +1,77 @@
+import asyncio
+from functools import partial
+from typing import Type, List, Union
+
+from pydantic.types import T
+
+from database import async_db
+
+
+# Awaitable counterparts of helpers/db_helper_v2. The queries are still written with the mongoengine
+# syntax (e.g. {'category__in': [...]}), mongoengine only translates them, the round trip goes through Motor.
+
+def collection(_class: Type[T]):
+    return async_db[_class._get_collection_name()]
+
+
+def _query(_class: Type[T], payload: dict) -> dict:
+    return _class.objects(**payload)._query
+
+
+def _ordering(_class: Type[T], order_by: Union[str, None]) -> list:
+    if not order_by:
+        return []
+    return _class.objects.order_by(order_by)._ordering
+
+
+def _build(_class: Type[T], son: Union[dict, None]) -> Union[T, None]:
+    if son is None:
+        return None
+    return _class._from_son(son)
+
+
+async def _to_list(_class: Type[T], cursor) -> List[T]:
+    return [_build(_class, son) async for son in cursor]
+
+
+async def get_all(_class: Type[T], field: str = 'name', reverse=False) -> List[T]:
+    cursor = collection(_class).find({}, sort=_ordering(_class, field if not reverse else f'-{field}'))
+    return await _to_list(_class, cursor)
+
+
+async def get_one(_class: Type[T], payload: dict) -> T:
+    son = await collection(_class).find_one(_query(_class, payload))
+    return _build(_class, son)
+
+
+async def find(_class: Type[T], payload: dict) -> List[T]:
+    return await _to_list(_class, collection(_class).find(_query(_class, payload)))
+
+
+async def count(_class: Type[T], payload: dict) -> int:
+    return await collection(_class).count_documents(_query(_class, payload))
+
+
+async def count_all(_class: Type[T]) -> int:
+    return await collection(_class).estimated_document_count()
+
+
+async def limit(_class: Type[T], start: Union[int, None] = None, stop: Union[int, None] = None,
+                order_by: str = None) -> List[T]:
+    cursor = collection(_class).find({}, sort=_ordering(_class, order_by))
+    if start:
+        cursor = cursor.skip(start)
+    if stop is not None:
+        cursor = cursor.limit(stop - (start or 0))
+    return await _to_list(_class, cursor)
+
+
+# Writes still go through mongoengine so the pre_save / post_save signals keep firing,
+# they just run on the default executor instead of the event loop.
+
+async def save(document: T, **kwargs) -> T:
+    return await asyncio.get_running_loop().run_in_executor(None, partial(document.save, **kwargs))
+
+
+async def delete(document: T):
+    return await asyncio.get_running_loop().run_in_executor(None, document.delete)
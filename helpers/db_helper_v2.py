@@ -1,6 +1,13 @@
-from typing import Type, List, Union
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from typing import Type, List, Union, Iterable, Dict, Tuple, Optional
+
+from bson import json_util, DBRef, ObjectId
+from mongoengine import Q, Document, ValidationError
 from pydantic.types import T
 
+from config import max_rows
+from exceptions import InvalidCursor
+
 
 def get_all(_class: Type[T], field: str = 'name', reverse=False) -> List[T]:
     return _class.objects.order_by(field if not reverse else f'-{field}')
@@ -29,3 +36,92 @@ def limit(_class: Type[T], start: Union[int, None] = None, stop: Union[int, None
     if start is None:
         return _class.objects[:stop].order_by(order_by)
     return _class.objects[start:stop].order_by(order_by)
+
+
+def reference_id(value):
+    """Id behind a reference value (DBRef, document or plain id), without dereferencing it."""
+    if isinstance(value, DBRef):
+        return value.id
+    if isinstance(value, Document):
+        return value.pk
+    return value
+
+
+def in_bulk(_class: Type[T], ids: Iterable, fields: Iterable[str] = None) -> Dict[str, T]:
+    """Loads every document of the given ids with a single $in query, keyed by their id as a string."""
+    ids = {str(reference_id(_id)) for _id in ids if _id}
+    if not ids:
+        return {}
+    query = _class.objects(id__in=list(ids))
+    if fields:
+        query = query.only(*fields)
+    return {str(document.id): document for document in query}
+
+
+# Keyset pagination
+
+def encode_cursor(values: list) -> str:
+    return urlsafe_b64encode(json_util.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json_util.loads(urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor(holder=(cursor,))
+    if not isinstance(values, list) or not values:
+        raise InvalidCursor(holder=(cursor,))
+    return values
+
+
+def _cursor_after(_class: Type[T], cursor: str, field: str) -> list:
+    """The decoded cursor, checked against the order_by field so a forged one can't reach the query."""
+    after = decode_cursor(cursor)
+    if len(after) != (1 if field == 'id' else 2) or not isinstance(after[-1], ObjectId):
+        raise InvalidCursor(holder=(cursor,))
+    if field != 'id' and after[0] is not None:
+        try:
+            _class._fields[field].validate(after[0])
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor(holder=(cursor,))
+    return after
+
+
+def _cursor_values(_class: Type[T], document, field: str) -> list:
+    if isinstance(document, dict):
+        _id = document.get('_id')
+        value = document.get(_class._fields[field].db_field) if field != 'id' else _id
+    else:
+        _id = document.id
+        value = getattr(document, field)
+    return [_id] if field == 'id' else [value, _id]
+
+
+def paginate(_class: Type[T], payload: dict = None, cursor: str = None, size: int = max_rows,
+             order_by: str = '-id', fields: Iterable[str] = None, as_pymongo=False) -> Tuple[List[T], Optional[str]]:
+    """
+    Keyset pagination: instead of skipping, the next page starts after the (order_by, _id) of the last document,
+    so every page costs the same index seek. Returns the page and the opaque cursor of the next one (None at the end).
+    The order_by field should be indexed and, when fields is given, part of it. Raises InvalidCursor for a bad cursor.
+    """
+    descending = order_by.startswith('-')
+    field = order_by.lstrip('-+')
+    field = 'id' if field == 'pk' else field
+    op = 'lt' if descending else 'gt'
+    query = _class.objects(**(payload or {}))
+    after = _cursor_after(_class, cursor, field) if cursor else None
+    if after and field == 'id':
+        query = query.filter(id__lt=after[0]) if descending else query.filter(id__gt=after[0])
+    elif after:
+        query = query.filter(Q(**{f'{field}__{op}': after[0]}) | Q(**{field: after[0], f'id__{op}': after[1]}))
+    query = query.order_by(order_by) if field == 'id' else query.order_by(order_by, '-id' if descending else 'id')
+    if fields:
+        query = query.only(*fields)
+    if as_pymongo:
+        query = query.as_pymongo()
+    documents = list(query.limit(size + 1))
+    next_cursor = None
+    if len(documents) > size:
+        documents = documents[:size]
+        next_cursor = encode_cursor(_cursor_values(_class, documents[-1], field))
+    return documents, next_cursor
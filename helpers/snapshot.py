@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+from hashlib import sha256
+from json import dumps
+
+from fastapi import Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Response body encoded once, served as is until the cached entry is invalidated."""
+    body: bytes
+    etag: str
+    headers: tuple = ()
+
+    @classmethod
+    def from_data(cls, data, headers: dict = None) -> "Snapshot":
+        body = dumps(jsonable_encoder(data), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return cls(body=body, etag=f'"{sha256(body).hexdigest()[:32]}"', headers=tuple((headers or {}).items()))
+
+    def matches(self, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        # If-None-Match uses the weak comparison, so W/"x" matches "x"
+        return self.etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+
+    def response(self, request: Request) -> Response:
+        headers = {'ETag': self.etag, 'Cache-Control': 'no-cache', **dict(self.headers)}
+        if self.matches(request.headers.get('if-none-match')):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=self.body, media_type='application/json', headers=headers)
@@ -0,0 +1,149 @@
+import gzip
+from mimetypes import add_type
+from os.path import isfile, join
+from typing import Union, Tuple
+
+import aiofiles
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from config import image_formats, static_immutable_prefixes, static_max_age, static_compressible
+from image import alternatives
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+add_type('image/avif', '.avif')
+add_type('image/webp', '.webp')
+
+negotiable = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff')
+encodings = (('br', '.br'), ('gzip', '.gz'))
+
+
+def precompress(path: str):
+    """Writes the .br (when brotli is installed) and .gz siblings of a file, only if they're smaller."""
+    with open(path, 'rb') as infile:
+        data = infile.read()
+    compressed = {'.gz': gzip.compress(data, compresslevel=9)}
+    if brotli:
+        compressed['.br'] = brotli.compress(data, quality=11)
+    for suffix, body in compressed.items():
+        if len(body) < len(data):
+            with open(f'{path}{suffix}', 'wb') as outfile:
+                outfile.write(body)
+
+
+def byte_range(header: str, size: int) -> Union[Tuple[int, int], None]:
+    """(start, end) of a single 'bytes=' range, None when it can't be satisfied. Raises ValueError if malformed."""
+    unit, _, ranges = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in ranges:
+        raise ValueError(header)
+    start, _, end = ranges.strip().partition('-')
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+class FileRangeResponse(Response):
+    """206 response for part of a file, sent with zero copy sendfile when the server supports it."""
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: str, start: int, end: int, size: int, headers: dict):
+        super().__init__(status_code=206, headers=headers)
+        self.path, self.start, self.end = path, start, end
+        self.headers['content-range'] = f'bytes {start}-{end}/{size}'
+        self.headers['content-length'] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        if scope.get('method') == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            return
+        count = self.end - self.start + 1
+        if 'http.response.zerocopysend' in scope.get('extensions', {}):
+            with open(self.path, 'rb') as file:
+                await send({'type': 'http.response.zerocopysend', 'file': file, 'offset': self.start, 'count': count,
+                            'more_body': False})
+            return
+        async with aiofiles.open(self.path, 'rb') as file:
+            await file.seek(self.start)
+            while count > 0:
+                chunk = await file.read(min(self.chunk_size, count))
+                count = count - len(chunk) if chunk else 0
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': count > 0})
+
+
+class MediaStaticFiles(StaticFiles):
+    """
+    StaticFiles for the uploads:
+    - a JPEG / PNG image is answered with its AVIF or WebP sibling when the client accepts it (in the image_formats
+      order) and the sibling was generated,
+    - files with a .br / .gz sibling are sent compressed when the client accepts the encoding,
+    - fingerprinted paths (static_immutable_prefixes) are cached for a year as immutable,
+    - single byte ranges are answered with 206, for the front page video.
+    """
+
+    def negotiate(self, path: str, scope) -> Union[str, None]:
+        if not path.lower().endswith(negotiable):
+            return None
+        accept = Headers(scope=scope).get('accept', '')
+        candidates = alternatives(path)
+        for extension in image_formats:
+            candidate = candidates.get(extension)
+            if f'image/{extension}' in accept and candidate and isfile(join(self.directory, candidate)):
+                return candidate
+        return None
+
+    def precompressed(self, path: str, scope) -> Union[Tuple[str, str], None]:
+        if not path.lower().endswith(static_compressible) or Headers(scope=scope).get('range'):
+            return None
+        accept_encoding = Headers(scope=scope).get('accept-encoding', '')
+        for encoding, suffix in encodings:
+            if encoding in accept_encoding and isfile(join(self.directory, f'{path}{suffix}')):
+                return f'{path}{suffix}', encoding
+        return None
+
+    async def get_response(self, path: str, scope):
+        served, encoding = self.negotiate(path, scope) or path, None
+        compressed = self.precompressed(served, scope)
+        if compressed:
+            served, encoding = compressed
+        response = await super().get_response(served, scope)
+        vary = [name for name, applies in (('Accept', path.lower().endswith(negotiable)),
+                                           ('Accept-Encoding', path.lower().endswith(static_compressible)))
+                if applies]
+        if vary:
+            response.headers['Vary'] = ', '.join(vary)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if response.status_code in (200, 206, 304):
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable' \
+                if path.startswith(static_immutable_prefixes) else f'public, max-age={static_max_age}'
+        return response
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers['Accept-Ranges'] = 'bytes'
+        request_headers = Headers(scope=scope)
+        header = request_headers.get('range')
+        if not header or response.status_code != 200:
+            return response
+        if_range = request_headers.get('if-range')
+        if if_range and if_range not in (response.headers.get('etag'), response.headers.get('last-modified')):
+            return response
+        size = stat_result.st_size
+        try:
+            requested = byte_range(header, size)
+        except ValueError:
+            return response
+        if requested is None:
+            return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+        headers = {name: value for name, value in response.headers.items() if name != 'content-length'}
+        return FileRangeResponse(str(full_path), *requested, size, headers)
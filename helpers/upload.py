@@ -0,0 +1,142 @@
+import asyncio
+from hashlib import sha256
+from os import makedirs, listdir, remove
+from os.path import exists, join, isfile
+from typing import Callable, List, Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+from config import upload_form_overhead
+from exceptions import UploadTooLarge, InvalidUpload
+
+
+class FilePart:
+    """
+    Callbacks of the multipart parser. The data of the field's file part is collected per chunk of the body,
+    store_upload writes it out before feeding the next one.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.filename = None
+        self.receiving = False
+        self.done = False
+        self.chunks = []
+        self.header_field = b''
+        self.header_value = b''
+        self.headers = {}
+
+    def callbacks(self) -> dict:
+        return {
+            'on_part_begin': self.on_part_begin,
+            'on_header_field': self.on_header_field,
+            'on_header_value': self.on_header_value,
+            'on_header_end': self.on_header_end,
+            'on_headers_finished': self.on_headers_finished,
+            'on_part_data': self.on_part_data,
+            'on_part_end': self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field, self.header_value = b'', b''
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b'content-disposition', b''))
+        if not self.done and options.get(b'name') == self.field.encode() and b'filename' in options:
+            self.filename = options.get(b'filename').decode('utf-8')
+            self.receiving = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.receiving:
+            self.chunks.append(data[start:end])
+
+    def on_part_end(self):
+        if self.receiving:
+            self.receiving, self.done = False, True
+
+    def pop(self) -> List[bytes]:
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+async def store_upload(request: Request, destination: Callable[[str], str], max_bytes: int, field: str = 'file') \
+        -> Tuple[str, str, str]:
+    """
+    Streams the file of a multipart/form-data body to destination(filename) while it's received, without
+    blocking the loop or spooling the body first, and returns (filename, path, SHA-256).
+    A declared Content-Length over the limit is refused before reading, UploadTooLarge is also raised as soon as
+    max_bytes is passed, nothing is left on disk then. InvalidUpload when the body has no such file.
+    """
+    too_large = UploadTooLarge(holder=(max_bytes // (1024 * 1024),))
+    length = request.headers.get('content-length', '')
+    if length.isdigit() and int(length) > max_bytes + upload_form_overhead:
+        raise too_large
+    content_type, options = parse_options_header(request.headers.get('content-type', ''))
+    if content_type != b'multipart/form-data' or b'boundary' not in options:
+        raise InvalidUpload(holder=(field,))
+    part = FilePart(field)
+    parser = MultipartParser(options.get(b'boundary'), part.callbacks())
+    digest = sha256()
+    size = 0
+    path = temp = buffer = None
+    try:
+        async for body in request.stream():
+            parser.write(body)
+            if part.filename and buffer is None:
+                path = destination(part.filename)
+                temp = f'{path}.part'
+                buffer = await aiofiles.open(temp, 'wb')
+            for chunk in part.pop():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large
+                digest.update(chunk)
+                await buffer.write(chunk)
+            if part.done:
+                break
+        if not part.done:
+            raise InvalidUpload(holder=(field,))
+        await buffer.close()
+        buffer = None
+        await aiofiles.os.rename(temp, path)
+    except BaseException:
+        if buffer is not None:
+            await buffer.close()
+        if temp:
+            await run_in_thread(remove_file, temp)
+        raise
+    return part.filename, path, digest.hexdigest()
+
+
+async def run_in_thread(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+def remove_file(path: str):
+    try:
+        remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def prepare_directory(path: str):
+    """Creates the directory, or empties it when it already exists."""
+    if not exists(path):
+        makedirs(path)
+        return
+    for f in listdir(path):
+        if isfile(join(path, f)):
+            remove(join(path, f))
@@ -1,8 +1,93 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from typing import Dict
+from os import getpid, replace, remove
+from os.path import exists, normpath
+from typing import Dict, List
 
 from PIL import Image
 
+from config import image_workers, image_formats, image_strip_metadata, image_sizes, static_compressible
+
+image_pool = ProcessPoolExecutor(max_workers=image_workers)
+# Variant jobs started by this worker, by original image
+image_jobs: Dict[str, asyncio.Future] = {}
+
+
+def encodable_formats() -> List[str]:
+    try:
+        # AVIF comes from the plugin on Pillow builds without native support
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+    Image.init()
+    return [extension for extension in image_formats if extension.upper() in Image.SAVE]
+
+
+def alternatives(path: str) -> Dict[str, str]:
+    """The modern format siblings of an image, e.g. {'webp': '.../image-1x.webp'}."""
+    base, own_extension = path.rsplit('.', 1)
+    return {extension: f'{base}.{extension}' for extension in image_formats if extension != own_extension.lower()}
+
+
+def write(image: Image.Image, path: str, **options):
+    """Saves through a temp file, a variant that exists is always complete."""
+    temp = f'{path}.{getpid()}.tmp'
+    try:
+        image.save(temp, format=Image.registered_extensions().get(f'.{path.rsplit(".", 1)[1].lower()}'), **options)
+        replace(temp, path)
+    finally:
+        if exists(temp):
+            remove(temp)
+
+
+def save(image: Image.Image, path: str, formats: List[str], original=True) -> List[str]:
+    # Empty EXIF / XMP keep Pillow from copying the source metadata
+    metadata = {'exif': b'', 'xmp': b''} if image_strip_metadata else {}
+    saved = []
+    if original:
+        write(image, path, **metadata)
+        saved.append(path)
+    converted = image if image.mode in ('RGB', 'RGBA') else image.convert('RGBA')
+    for extension, alternative in alternatives(path).items():
+        if extension in formats:
+            write(converted, alternative, **image_formats.get(extension), **metadata)
+            saved.append(alternative)
+    return saved
+
+
+def resize_variant(original_image: str, target: str, width: int, quality: int) -> str:
+    """Runs in the image pool, writes original_image scaled down to width (never up) to target."""
+    encodable_formats()
+    metadata = {'exif': b'', 'xmp': b''} if image_strip_metadata else {}
+    extension = target.rsplit('.', 1)[1]
+    # source keeps the file handle, image may be rebound to a converted copy
+    with Image.open(original_image) as source:
+        source.draft('RGB', (width, width * source.height // max(source.width, 1)))
+        source.thumbnail((width, source.height))
+        image = source
+        if extension in ('jpg', 'jpeg') and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif extension in image_formats and image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        write(image, target, **dict(image_formats.get(extension, {}), quality=quality), **metadata)
+    return target
+
+
+def create_variants(original_image: str, variants: Dict[int, str]) -> List[str]:
+    """
+    Runs in the image pool. The original is decoded once and downscaled progressively, largest size first,
+    every variant is resized from the previous one. Each one is also written in the image_formats Pillow can encode.
+    """
+    formats = encodable_formats()
+    with Image.open(original_image) as image:
+        image.load()
+        created = save(image, original_image, formats, original=False)
+        for size, variant in sorted(variants.items(), reverse=True):
+            image.thumbnail((size, size))
+            created += save(image, variant, formats)
+    return created
+
 
 @dataclass
 class ResponsiveImage:
@@ -14,22 +99,45 @@ class ResponsiveImage:
     #     '1200w': '',
     #     '1600w': ''
     # })
-    sizes_number: Dict = field(default_factory=lambda: {
-        '400': '1x',
-        '800': '2x',
-        '1200': '3x',
-        '1600': '4x'
-    })
-
-    async def create(self):
-        image = Image.open(self.original_image)
-        for size, rep in {int(k): v for k, v in self.sizes_number.items()}.items():
-            image.thumbnail((size, size))
-            temp = self.original_image.rsplit('/', 1)
-            path = temp[0]
-            filename_with_extension = temp[1]
-            temp_filename = filename_with_extension.rsplit('.')
-            extension = temp_filename[1]
-            image.save(f'{path}/{self.fingerprint}image-{rep}.{extension}')
-            image = Image.open(self.original_image)
-            # self.sizes[f'{size}w'] = f'{path}/image-{rep}.{extension}'
+    sizes_number: Dict = field(default_factory=lambda: dict(image_sizes))
+
+    def variants(self) -> Dict[int, str]:
+        path, filename_with_extension = self.original_image.rsplit('/', 1)
+        extension = filename_with_extension.rsplit('.', 1)[1]
+        if extension.lower() in static_compressible:
+            # Not a raster image (e.g. SVG), it is served as is without variants
+            return {}
+        return {int(size): f'{path}/{self.fingerprint}image-{rep}.{extension}'
+                for size, rep in self.sizes_number.items()}
+
+    @classmethod
+    def from_path(cls, original_image: str) -> "ResponsiveImage":
+        """The stored images are named {fingerprint}image.{extension}."""
+        filename = original_image.rsplit('/', 1)[-1]
+        return cls(original_image=original_image, fingerprint=filename.rsplit('image.', 1)[0])
+
+    @property
+    def key(self) -> str:
+        return normpath(self.original_image)
+
+    def create(self) -> asyncio.Future:
+        """Schedules the variants in the image pool and returns without waiting for them."""
+        job = asyncio.get_running_loop().run_in_executor(image_pool, create_variants, self.original_image,
+                                                         self.variants())
+        image_jobs[self.key] = job
+
+        def forget(done: asyncio.Future):
+            # Failed jobs are kept so status can report them
+            if image_jobs.get(self.key) is done and not done.cancelled() and not done.exception():
+                image_jobs.pop(self.key, None)
+
+        job.add_done_callback(forget)
+        return job
+
+    def status(self) -> str:
+        job = image_jobs.get(self.key)
+        if job and job.done() and (job.cancelled() or job.exception()):
+            return 'failed'
+        if all(exists(variant) for variant in self.variants().values()):
+            return 'ready'
+        return 'pending'
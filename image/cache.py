@@ -0,0 +1,102 @@
+import asyncio
+from glob import glob, escape as glob_escape
+from hashlib import sha1
+from os import makedirs, scandir, remove, utime, stat
+from os.path import join, getmtime, exists
+from threading import Lock
+from typing import Dict
+
+from fastapi import HTTPException, status
+
+from config import image_cache_dir, image_cache_max_bytes, image_resize_max_pending
+from image import image_pool, resize_variant
+
+
+class VariantCache:
+    """
+    On demand image variants on disk, bounded by max_bytes and evicted least recently used first.
+    The file mtime is the last access, concurrent requests for the same variant share one resize (single flight).
+    At most max_pending resizes are in flight, the pool queue doesn't grow without bound.
+    """
+
+    def __init__(self, directory: str = image_cache_dir, max_bytes: int = image_cache_max_bytes,
+                 max_pending: int = image_resize_max_pending):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.total = None
+        self.lock = Lock()
+
+    def path(self, original_image: str, width: int, extension: str, quality: int) -> str:
+        # The original mtime is part of the key, replacing the original misses the old variants
+        key = f'{original_image}:{getmtime(original_image)}:{width}:{quality}'
+        return join(self.directory, f'{sha1(key.encode()).hexdigest()}.{extension}')
+
+    async def get(self, original_image: str, width: int, extension: str, quality: int) -> str:
+        target = self.path(original_image, width, extension, quality)
+        if exists(target):
+            utime(target)
+            return target
+        job = self.in_flight.get(target)
+        if job is None:
+            if len(self.in_flight) >= self.max_pending:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many requests, please try again.",
+                    headers={"Retry-After": "1"},
+                )
+            job = asyncio.ensure_future(self.create(original_image, target, width, quality))
+            self.in_flight[target] = job
+            job.add_done_callback(lambda _: self.in_flight.pop(target, None))
+        return await asyncio.shield(job)
+
+    async def create(self, original_image: str, target: str, width: int, quality: int) -> str:
+        makedirs(self.directory, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(image_pool, resize_variant, original_image, target, width, quality)
+        except Exception:
+            # A worker that died mid resize leaves its temp file behind
+            await loop.run_in_executor(None, self.discard, target)
+            raise
+        await loop.run_in_executor(None, self.added, stat(target).st_size)
+        return target
+
+    @staticmethod
+    def discard(target: str):
+        for temp in glob(f'{glob_escape(target)}.*.tmp'):
+            try:
+                remove(temp)
+            except FileNotFoundError:
+                pass
+
+    def added(self, size: int):
+        with self.lock:
+            if self.total is None:
+                self.total = sum(entry.stat().st_size for entry in self.entries())
+            else:
+                self.total += size
+            if self.total > self.max_bytes:
+                self.evict()
+
+    def entries(self):
+        # Files still being written by the pool end with .tmp
+        return [entry for entry in scandir(self.directory) if entry.is_file() and not entry.name.endswith('.tmp')]
+
+    def evict(self):
+        # Down to 90% of the limit, so a full cache doesn't rescan the directory on every new variant
+        entries = sorted(self.entries(), key=lambda entry: entry.stat().st_mtime)
+        self.total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.total <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                remove(entry.path)
+                self.total -= size
+            except FileNotFoundError:
+                pass
+
+
+variant_cache = VariantCache()
@@ -1,20 +1,12 @@
-from calendar import month_name
-from locale import setlocale, LC_ALL
+from os import getpid, replace, remove
+from os.path import exists
+from typing import Dict
 
-from jinja2 import Template
 from weasyprint import HTML
 
 from helpers import send_email
-
-mapping = {
-    'pt': 'pt_PT',
-    'en-US': 'en_US'
-}
-
-currencies = {
-    'eur': '€',
-    'usd': '$'
-}
+from helpers.db_helper_v2 import in_bulk, reference_id
+from templates.registry import localized, get_date, currencies
 
 translations = {
     'pt': {
@@ -60,49 +52,66 @@ translations = {
 }
 
 
-def get_date(date, locale):
-    setlocale(LC_ALL, mapping.get(locale))
-    date_now = date
-    return f'{month_name[date_now.month].capitalize()} {date_now.day}, {date_now.year}'
+# Enough of the product for the invoice lines
+invoice_product_fields = ('name', 'price', 'currency')
 
+invoice_templates = localized('invoice/invoice.html', {
+    locale: {'translations': strings, 'currencies': currencies} for locale, strings in translations.items()
+})
 
-def generate_invoice(order, payment, locale):
-    with open("invoice/invoice.html", encoding="utf-8") as html_template:
-        html = html_template.read()
-        temp = Template(html)
+
+def render_invoice(order, payment, locale, user=None, products: Dict[str, object] = None) -> str:
+    """user and products (by id) can be loaded beforehand for a batch, otherwise they're read for this order."""
+    if products is None:
+        from models import ProductModel
+        products = in_bulk(ProductModel, [item._data.get('product') for item in order.items],
+                           fields=invoice_product_fields)
+    items = [{'product': products.get(str(reference_id(item._data.get('product')))), 'quantity': item.quantity}
+             for item in order.items]
+    # Orders from before the invoice counter are shown with their order number
+    invoice_number = order.invoice_number or order.number
     # Render Jinja blocks
-    out = temp.render(
-        title=translations.get(locale).get('title').format(order.number),
-        user=order.user,
+    return invoice_templates.get(locale).render(
+        title=translations.get(locale).get('title').format(invoice_number),
+        invoice_number=invoice_number,
+        user=user or order.user,
         order=order,
+        items=items,
+        currency=items[0].get('product').currency if items and items[0].get('product') else None,
         payment_method=translations.get(locale).get(payment.method),
-        translations=translations.get(locale),
         date=get_date(order.updated_at, locale),
-        currencies=currencies
     )
-    HTML(string=out).write_pdf(f'invoice/invoices/{order.id}.pdf')
+
+
+def invoice_path(order_id) -> str:
+    return f'invoice/invoices/{order_id}.pdf'
+
+
+def write_pdf(html: str, path: str) -> str:
+    """Runs in the invoice pool, the PDF is written next to path and renamed so it's never read half written."""
+    temp = f'{path}.{getpid()}.tmp'
+    try:
+        HTML(string=html).write_pdf(temp)
+        replace(temp, path)
+    finally:
+        if exists(temp):
+            remove(temp)
+    return path
+
+
+def generate_invoice(order, payment, locale):
+    write_pdf(render_invoice(order, payment, locale), invoice_path(order.id))
     # from_string(out, f'invoice/invoices/{order.id}.pdf')
 
 
 def send_invoice(order, payment):
-    with open("invoice/invoice.html", encoding="utf-8") as html_template:
-        html = html_template.read()
-        temp = Template(html)
-    # Render Jinja blocks
-    out = temp.render(
-        title=translations.get(order.user.preferred_language).get('title').format(order.id),
-        user=order.user,
-        order=order,
-        payment_method=translations.get(order.user.preferred_language).get(payment.method),
-        translations=translations.get(order.user.preferred_language),
-        date=get_date(order.updated_at, order.user.preferred_language),
-        currencies=currencies
-    )
-    send_email({'subject': translations.get(order.user.preferred_language).get('subject').
+    user = order.user
+    out = render_invoice(order, payment, user.preferred_language, user=user)
+    send_email({'subject': translations.get(user.preferred_language).get('subject').
                format(order.updated_at.strftime("%d/%m/%Y")),
                 'message': out},
-               filename=f'invoice/invoices/{order.id}.pdf' if order.user.nif else None,
-               to=order.user.email)
+               filename=invoice_path(order.id) if user.nif else None,
+               to=user.email)
 
 
 if __name__ == '__main__':
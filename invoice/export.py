@@ -0,0 +1,96 @@
+import asyncio
+from itertools import chain
+from os.path import exists, getsize
+from typing import AsyncIterator, Dict, List
+from zipfile import ZipFile, ZipInfo, ZIP_STORED
+
+import aiofiles
+
+from invoice import invoice_path
+from invoice.jobs import queue_invoices
+
+
+class ZipStream:
+    """
+    Write only file object for ZipFile, what's written is kept until the next pop.
+    It has no tell / seek, so ZipFile writes the entries with data descriptors and never goes back.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def is_fresh(order) -> bool:
+    """The stored PDF is newer than the last change of the order."""
+    return bool(order.is_invoice_generated and order.last_updated_at_invoice and order.updated_at
+                and order.last_updated_at_invoice > order.updated_at and exists(invoice_path(order.id)))
+
+
+def invoice_name(order) -> str:
+    return f'invoice_{order.invoice_number or order.number}_{order.id}.pdf'
+
+
+async def stored(order):
+    return order, True
+
+
+async def rendered(order, job: asyncio.Task):
+    # as_completed hands back new awaitables, the order comes back with the result
+    return order, await job
+
+
+async def export_invoices(orders: List, payments: Dict[str, object], chunk_size: int = 256 * 1024) \
+        -> AsyncIterator[bytes]:
+    """
+    ZIP of the orders invoices, built while it's sent. Up to date PDFs are reused and go first,
+    the others are rendered in the invoice pool in parallel and added as they finish.
+    Orders without payment or whose render failed are listed in errors.txt.
+    """
+    stream = ZipStream()
+    errors = []
+    queued = []
+    ready = []
+    for order in orders:
+        payment = payments.get(str(order.id))
+        if is_fresh(order):
+            ready.append(order)
+        elif not payment:
+            errors.append(f'{order.number} ({order.id}): payment not found')
+        else:
+            queued.append(order)
+    jobs = queue_invoices(queued, payments)
+    pending = [rendered(order, jobs[str(order.id)]) for order in queued]
+
+    with ZipFile(stream, mode='w', compression=ZIP_STORED) as zip_file:
+        for job in chain(map(stored, ready), asyncio.as_completed(pending)):
+            order, success = await job
+            path = invoice_path(order.id)
+            if not success or not exists(path):
+                errors.append(f'{order.number} ({order.id}): invoice rendering failed')
+                continue
+            entry = ZipInfo(invoice_name(order), date_time=order.updated_at.timetuple()[:6])
+            entry.file_size = getsize(path)
+            # Written inline, an aborted download closes the entry before the archive
+            with zip_file.open(entry, mode='w') as target:
+                async with aiofiles.open(path, 'rb') as source:
+                    while True:
+                        chunk = await source.read(chunk_size)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        yield stream.pop()
+            yield stream.pop()
+        if errors:
+            zip_file.writestr('errors.txt', '\n'.join(errors))
+    yield stream.pop()
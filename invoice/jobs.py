@@ -0,0 +1,115 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from config import invoice_workers, invoice_job_timeout_minutes
+from helpers.db_helper_async import collection
+from helpers.db_helper_v2 import in_bulk, reference_id
+from invoice import render_invoice, write_pdf, invoice_path, invoice_product_fields
+
+invoice_pool = ProcessPoolExecutor(max_workers=invoice_workers)
+# Jobs running in this worker, by order id
+invoice_jobs: Dict[str, asyncio.Task] = {}
+
+
+def prepare_invoices(orders: List, payments: Dict[str, object]) -> Dict[str, str]:
+    """
+    Runs in a thread, off the loop. Numbers the orders, marks them as queued with one bulk write and fills the
+    templates with the users and products of the whole batch loaded at once.
+    Returns the HTML by order id, or the error an order failed with.
+    """
+    from models import OrderModel, UserModel, ProductModel
+    OrderModel.assign_invoice_numbers(orders)
+    now = datetime.now()
+    OrderModel._get_collection().bulk_write([
+        UpdateOne({'_id': order.id}, {'$set': {'invoice_number': order.invoice_number, 'invoice_status': 'queued',
+                                               'invoice_error': '', 'invoice_queued_at': now}})
+        for order in orders], ordered=False)
+    for order in orders:
+        order.invoice_status, order.invoice_queued_at = 'queued', now
+    users = in_bulk(UserModel, [order._data.get('user') for order in orders],
+                    fields=('first_name', 'last_name', 'email', 'preferred_language'))
+    products = in_bulk(ProductModel, [item._data.get('product') for order in orders for item in order.items],
+                       fields=invoice_product_fields)
+    html = {}
+    for order in orders:
+        user = users.get(str(reference_id(order._data.get('user'))))
+        try:
+            html[str(order.id)] = render_invoice(order, payments.get(str(order.id)), user.preferred_language, user,
+                                                 products)
+        except Exception as e:
+            # Only this order's job fails
+            html[str(order.id)] = e
+    return html
+
+
+def queue_invoices(orders: List, payments: Dict[str, object]) -> Dict[str, asyncio.Task]:
+    """
+    Renders the invoices of the orders in the background, returns the jobs by order id. The batch is prepared
+    in a thread (prepare_invoices), the PDFs are written in the invoice pool. Orders already rendering keep their job.
+    The result ends up in order.invoice_status.
+    """
+    jobs = {}
+    batch = []
+    for order in orders:
+        job = invoice_jobs.get(str(order.id))
+        if job and not job.done():
+            jobs[str(order.id)] = job
+        else:
+            batch.append(order)
+    if not batch:
+        return jobs
+    # The jobs are registered right away, a second call can't queue the same order while the batch is prepared
+    prepared = asyncio.get_running_loop().run_in_executor(None, prepare_invoices, batch, payments)
+    for order in batch:
+        key = str(order.id)
+        job = asyncio.ensure_future(run_invoice_job(order.id, prepared))
+        invoice_jobs[key] = job
+        job.add_done_callback(lambda _, key=key: invoice_jobs.pop(key, None))
+        jobs[key] = job
+    return jobs
+
+
+def queue_invoice(order, payment) -> asyncio.Task:
+    return queue_invoices([order], {str(order.id): payment})[str(order.id)]
+
+
+async def run_invoice_job(order_id: ObjectId, prepared: asyncio.Future) -> bool:
+    from models import OrderModel
+    orders = collection(OrderModel)
+    try:
+        html = (await prepared)[str(order_id)]
+        if isinstance(html, Exception):
+            raise html
+        await asyncio.get_running_loop().run_in_executor(invoice_pool, write_pdf, html, invoice_path(order_id))
+    except Exception as e:
+        await orders.update_one({'_id': order_id}, {'$set': {'invoice_status': 'failed', 'invoice_error': str(e)}})
+        return False
+    await orders.update_one({'_id': order_id}, {'$set': {'invoice_status': 'done', 'is_invoice_generated': True,
+                                                          'last_updated_at_invoice': datetime.now()}})
+    return True
+
+
+async def expire_invoice_job(order) -> bool:
+    """
+    A queued invoice without a running job here, queued longer than invoice_job_timeout_minutes ago, lost its job
+    in a worker restart. It's marked failed so it can be queued again, returns whether it was.
+    """
+    from models import OrderModel
+    job = invoice_jobs.get(str(order.id))
+    if order.invoice_status != 'queued' or (job and not job.done()):
+        return False
+    if order.invoice_queued_at and order.invoice_queued_at > datetime.now() - timedelta(
+            minutes=invoice_job_timeout_minutes):
+        return False
+    error = 'The rendering job was interrupted, queue the invoice again.'
+    # Unless it was queued again in the meantime
+    await collection(OrderModel).update_one({'_id': order.id, 'invoice_status': 'queued',
+                                             'invoice_queued_at': order.invoice_queued_at},
+                                            {'$set': {'invoice_status': 'failed', 'invoice_error': error}})
+    order.invoice_status, order.invoice_error = 'failed', error
+    return True
@@ -1,53 +1,88 @@
 # Language Helper
+import re
 from dataclasses import dataclass, field
-from json import load, dump, JSONDecodeError
-from os.path import exists
-from typing import Optional, List
+from typing import Optional, List, Iterable, Union
 
 from config import available_languages
 
+# Keys written for an entity start with its id, e.g. '{id}_name' or '{id}_options_{index}'
+entity_key = re.compile(r'^([0-9a-f]{24})_(.+)$')
+
+
+def split_key(key: str) -> (Union[str, None], str):
+    match = entity_key.match(key)
+    return (match.group(1), match.group(2)) if match else (None, key)
+
 
 @dataclass
 class AppLanguage:
+    """
+    In-memory copy of the translations collection, per language both by key and by entity
+    ({prefix: {entity_id: {'name': ..., 'options_0': ...}}}).
+    version is the highest translation version loaded, workers catch up by reading the newer ones.
+    """
     prefixes: Optional[List[str]]
     languages: dict = field(default_factory=dict)
+    entities: dict = field(default_factory=dict)
+    version: int = 0
 
     def __post_init__(self):
-        for lang in self.prefixes:
-            if exists(f'languages/{lang}.json'):
-                with open(f'languages/{lang}.json', 'r') as infile:
-                    try:
-                        read_data: dict = load(infile)
-                        self.languages.update({
-                            lang: read_data
-                        })
-                    except JSONDecodeError:
-                        pass
-            else:
-                self.languages.update({
-                    lang: {}
-                })
+        self.clear()
+
+    def load(self, translations: Iterable[dict]):
+        """Applies translation documents ({'_id': key, 'values': {prefix: text}, 'version': n}) read from the db."""
+        for translation in translations:
+            key, values = translation.get('_id'), translation.get('values') or {}
+            for prefix in set(self.languages) - set(values):
+                self.pop_key(prefix, key)
+            for prefix, value in values.items():
+                self.set_key(prefix, key, value)
+            self.version = max(self.version, translation.get('version') or 0)
+
+    def set_key(self, prefix: str, key: str, value):
+        self.languages.setdefault(prefix, {})[key] = value
+        entity, name = split_key(key)
+        if entity:
+            self.entities.setdefault(prefix, {}).setdefault(entity, {})[name] = value
+
+    def pop_key(self, prefix: str, key: str):
+        self.languages.get(prefix, {}).pop(key, None)
+        entity, name = split_key(key)
+        fields = self.entities.get(prefix, {}).get(entity)
+        if fields is not None:
+            fields.pop(name, None)
+            if not fields:
+                self.entities[prefix].pop(entity, None)
 
     def update_strings(self, prefix: str, language_strings: dict):
-        self.languages.get(prefix).update(language_strings)
-        # if exists(f'languages/{prefix}.json'):
-        with open(f'languages/{prefix}.json', 'w') as outfile:
-            dump(self.languages.get(prefix), outfile, sort_keys=True, indent=4)
+        for key, value in language_strings.items():
+            self.set_key(prefix, key, value)
+
+    def remove_strings(self, prefix: str, keys: Iterable[str]):
+        for key in keys:
+            self.pop_key(prefix, key)
 
-    def refresh_strings(self, prefix: str):
-        if exists(f'languages/{prefix}.json'):
-            with open(f'languages/{prefix}.json', 'r') as file:
-                data: dict = load(file)
-                self.languages.get(prefix).update(data)
+    def remove_entity(self, entity: str):
+        for prefix in self.languages:
+            for name in self.entities.get(prefix, {}).pop(entity, {}):
+                self.languages[prefix].pop(f'{entity}_{name}', None)
 
     def get_text(self, prefix: str, text_key: str) -> str:
         return self.languages.get(prefix).get(text_key)
 
+    def get_entity(self, prefix: str, entity: str) -> dict:
+        """Every localized field of an entity in one lookup, e.g. {'name': ..., 'description': ...}."""
+        return self.entities.get(prefix, {}).get(str(entity), {})
+
     def clear(self):
         for prefix in self.prefixes:
             self.languages.update({
                 prefix: {}
             })
+            self.entities.update({
+                prefix: {}
+            })
+        self.version = 0
 
 
 languages = AppLanguage(available_languages)
@@ -17,6 +17,10 @@ translations = {
         "bot_error": "Our system detected that you are not human.",
         "user_not_active": "Please check your email address and activate your account first.",
         "cart_empty": "Can't create order with an empty bag.",
+        "product_out_of_stock": "The product '{}' doesn't have enough stock.",
+        "upload_too_large": "The file is larger than the {} MB limit.",
+        "invalid_cursor": "The cursor '{}' is not valid.",
+        "invalid_upload": "The request has no '{}' file.",
     },
     'pt': {
         "category_not_unique": "A categoria '{}' já existe.",
@@ -36,5 +40,9 @@ translations = {
         "bot_error": "O nosso sistema detetou que não é humano.",
         "user_not_active": "Por favor verifique o seu endereço de e-mail e ative a sua conta.",
         "cart_empty": "Não é possível criar um pedido com o cesto vazio.",
+        "product_out_of_stock": "O produto '{}' não tem stock suficiente.",
+        "upload_too_large": "O ficheiro é maior que o limite de {} MB.",
+        "invalid_cursor": "O cursor '{}' não é válido.",
+        "invalid_upload": "O pedido não tem o ficheiro '{}'.",
     }
 }
@@ -4,9 +4,13 @@ from typing import List
 from mongoengine import Document, StringField, ListField, signals, EmbeddedDocument, \
     EmbeddedDocumentField, DynamicField
 
+from config import available_languages
 from helpers import convert_to_slug
+from helpers.cache import invalidate_on_change
+from languages import languages
 from models.base import Base, OID
-from models.language import Language
+from models.language import TranslationBatch
+from models.media import track_images
 
 
 class OptionsModel(EmbeddedDocument):
@@ -17,7 +21,8 @@ class OptionsModel(EmbeddedDocument):
 
 class AttributeModel(Document, Base):
     meta = {
-        'collection': 'attributes'
+        'collection': 'attributes',
+        'indexes': ['name', 'slug']
     }
     name: str = StringField(required=True, max_length=70)
     options: List['OptionsModel'] = ListField(EmbeddedDocumentField(OptionsModel))
@@ -55,36 +60,39 @@ class AttributeModel(Document, Base):
     #         lang.strings.pop(f'{obj.id}_options_{index}': option.get('name'), None)
 
     @staticmethod
-    def inject_after_clear(_id: OID, index: int, option: dict, language, locale: str):
-        language.add_strings({
-            f'{_id}_options_{index}': option.get('name') if locale == language.prefix else ''
-            if not language.strings.get(f'{_id}_options_{index}')
-            else language.strings.get(f'{_id}_options_{index}')
+    def inject_after_clear(_id: OID, index: int, option: dict, batch: TranslationBatch, prefix: str, locale: str):
+        current = languages.get_text(prefix, f'{_id}_options_{index}')
+        batch.set(prefix, {
+            f'{_id}_options_{index}': option.get('name') if locale == prefix else ''
+            if not current
+            else current
         })
-        language.save()
 
     @classmethod
     async def inject_options(cls, obj, payload, locale):
-        languages = Language.get_all()
+        batch = TranslationBatch()
         options_out = []
         old_length = len(obj.options)
         new_length = len(payload.get('options'))
         if old_length > new_length:
             indexes_to_pop = range(old_length, new_length - 1, -1)
-            for lang in languages:
-                for x in indexes_to_pop:
-                    lang.strings.pop(f'{obj.id}_options_{x}', None)
+            for prefix in available_languages:
+                batch.unset(prefix, [f'{obj.id}_options_{x}' for x in indexes_to_pop])
 
         for index, option in enumerate(payload.get('options')):
-            for language in languages:
+            for prefix in available_languages:
                 if isinstance(option.get('name'), str):
-                    cls.inject_after_clear(obj.id, index, option, language, locale)
+                    cls.inject_after_clear(obj.id, index, option, batch, prefix, locale)
             options_out.append(OptionsModel(**option))
+        await batch.flush()
         obj.options = options_out
         return obj
 
 
 signals.post_init.connect(AttributeModel.post_init, sender=AttributeModel)
+signals.post_save.connect(invalidate_on_change, sender=AttributeModel)
+signals.post_delete.connect(invalidate_on_change, sender=AttributeModel)
+track_images(AttributeModel)
 
 if __name__ == '__main__':
     c = AttributeModel(
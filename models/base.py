@@ -3,7 +3,8 @@ from typing import Type, Union
 from bson import ObjectId
 from bson.errors import InvalidId
 
-from helpers.db_helper_v2 import get_one, get_all, count, find, limit, count_all
+from config import max_rows
+from helpers.db_helper_v2 import get_one, get_all, count, find, limit, count_all, paginate
 
 from pydantic.types import T
 
@@ -59,6 +60,10 @@ class Base:
     def limit(cls, start:  Union[int, None] = None, stop:  Union[int, None] = None, order_by: str = None):
         return limit(cls, start, stop, order_by)
 
+    @classmethod
+    def paginate(cls, payload: dict = None, cursor: str = None, size: int = max_rows, order_by: str = '-id'):
+        return paginate(cls, payload, cursor, size, order_by)
+
     # def add_translation(self, lang: str, payload: dict):
     #     find_lang = await Language.get_language(lang)
     #     await find_lang.add_strings(payload)
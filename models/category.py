@@ -4,12 +4,15 @@ from typing import List, Optional
 from mongoengine import Document, StringField, ListField, ReferenceField, signals, IntField
 
 from helpers import convert_to_slug
+from helpers.cache import invalidate_on_change
 from models.base import Base
+from models.media import track_images
 
 
 class CategoryModel(Document, Base):
     meta = {
-        'collection': 'categories'
+        'collection': 'categories',
+        'indexes': ['name', 'slug']
     }
     name: str = StringField(required=True, max_length=70)
     description: Optional[str] = StringField(required=False, default="")
@@ -64,6 +67,9 @@ class CategoryModel(Document, Base):
 
 
 signals.post_save.connect(CategoryModel.post_save, sender=CategoryModel)
+signals.post_save.connect(invalidate_on_change, sender=CategoryModel)
+signals.post_delete.connect(invalidate_on_change, sender=CategoryModel)
+track_images(CategoryModel)
 
 if __name__ == '__main__':
     c = CategoryModel(
@@ -0,0 +1,67 @@
+from threading import Lock
+from typing import Callable, List
+
+from mongoengine import Document, StringField, IntField
+from pymongo import ReturnDocument
+
+
+class CounterModel(Document):
+    meta = {
+        'collection': 'counters'
+    }
+    id: str = StringField(primary_key=True)
+    value: int = IntField(default=0)
+
+    # Counters already aligned with the existing data in this process
+    seeded = set()
+
+    @classmethod
+    def next_value(cls, name: str, seed: Callable[[], int] = None, increment: int = 1, session=None) -> int:
+        """Atomically adds increment to the counter (findOneAndUpdate $inc) and returns the new value."""
+        collection = cls._get_collection()
+        if seed and name not in cls.seeded:
+            # First use, carry on from the numbers already handed out before the counter existed
+            collection.update_one({'_id': name}, {'$max': {'value': seed()}}, upsert=True, session=session)
+            cls.seeded.add(name)
+        counter = collection.find_one_and_update({'_id': name}, {'$inc': {'value': increment}}, upsert=True,
+                                                 return_document=ReturnDocument.AFTER, session=session)
+        return counter.get('value')
+
+
+class Sequence:
+    """
+    Collision free number allocator backed by a counter document, O(1) per number.
+    With a block_size above 1 every worker reserves that many numbers per round trip and hands them out locally,
+    numbers then stay unique but are no longer in creation order across workers (and a restart leaves gaps).
+    """
+
+    def __init__(self, name: str, seed: Callable[[], int] = None, block_size: int = 1):
+        self.name = name
+        self.seed = seed
+        self.block_size = max(1, block_size)
+        self._lock = Lock()
+        self._next = 1
+        self._last = 0
+
+    def next_value(self, session=None) -> int:
+        if self.block_size == 1:
+            return CounterModel.next_value(self.name, self.seed, session=session)
+        with self._lock:
+            if self._next > self._last:
+                # Blocks are reserved outside of any transaction, an aborted one only leaves a gap
+                self._last = CounterModel.next_value(self.name, self.seed, increment=self.block_size)
+                self._next = self._last - self.block_size + 1
+            value = self._next
+            self._next += 1
+            return value
+
+    def next_values(self, count: int) -> List[int]:
+        """count numbers, what the local block can't cover is reserved with a single round trip."""
+        with self._lock:
+            values = list(range(self._next, min(self._last, self._next + count - 1) + 1))
+            self._next += len(values)
+            missing = count - len(values)
+            if missing:
+                last = CounterModel.next_value(self.name, self.seed, increment=missing)
+                values += range(last - missing + 1, last + 1)
+            return values
@@ -0,0 +1,37 @@
+from typing import List, Dict
+
+from mongoengine import Document
+
+
+def indexed_models() -> List[Document]:
+    from models import AttributeModel, CategoryModel, ProductTypeModel, ProductModel, UserModel, OrderModel, \
+        PaymentModel
+    from models.language import Language, TranslationModel
+    from models.media import MediaModel
+    from models.settings import SettingsModel
+    return [AttributeModel, CategoryModel, ProductTypeModel, ProductModel, UserModel, OrderModel, PaymentModel,
+            Language, TranslationModel, MediaModel, SettingsModel]
+
+
+def ensure_indexes():
+    """Creates the indexes declared in the models meta, existing ones are left untouched."""
+    for model in indexed_models():
+        model.ensure_indexes()
+
+
+def index_report() -> Dict[str, dict]:
+    """
+    Per collection: declared indexes missing from the database, indexes in the database that no model declares,
+    and indexes without any access since the server started (from $indexStats).
+    """
+    report = {}
+    for model in indexed_models():
+        comparison = model.compare_indexes()
+        stats = model._get_collection().aggregate([{'$indexStats': {}}])
+        report[model._get_collection_name()] = {
+            'missing': comparison.get('missing', []),
+            'extra': comparison.get('extra', []),
+            'unused': [stat.get('name') for stat in stats
+                       if stat.get('name') != '_id_' and not stat.get('accesses', {}).get('ops')],
+        }
+    return report
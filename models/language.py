@@ -1,29 +1,176 @@
-from typing import List
+import asyncio
+import logging
+from collections import defaultdict
+from typing import List, Iterable, Tuple
 
-from mongoengine import Document, StringField, DictField
+from mongoengine import Document, StringField, DictField, IntField
+from pymongo import UpdateOne
 
+from config import translation_sync_interval, translation_sync_overlap
+from helpers.db_helper_async import collection
 from helpers.db_helper_v2 import get_one, get_all
-from languages import languages
+from languages import languages, split_key
+from models.counter import Sequence
+
+logger = logging.getLogger(__name__)
 
 
 class Language(Document):
     prefix = StringField(required=True, default="", null=True)
+    # Kept for the migration only, the strings now live in the translations collection
     strings = DictField(required=False, default={})
 
     meta = {
-        'collection': 'languages'
+        'collection': 'languages',
+        'indexes': ['prefix']
     }
 
     @classmethod
     def get_language(cls, prefix: str) -> "Language":
         return get_one(cls, {'prefix': prefix})
 
-    def add_strings(self, strings: dict, internal=False):
-        self.strings.update(strings)
-        if not internal:
-            languages.update_strings(self.prefix, strings)
-        self.save()
+    async def add_strings(self, strings: dict, internal=False):
+        batch = TranslationBatch()
+        batch.set(self.prefix, strings)
+        await batch.flush(update_languages=not internal)
 
     @classmethod
     def get_all(cls) -> List["Language"]:
         return get_all(cls, 'prefix')
+
+
+class TranslationModel(Document):
+    """
+    One document per translation key, {'_id': key, 'entity': id, 'values': {prefix: text}, 'version': n}.
+    Editing a string is a small upsert of values.<prefix>, the entity field groups the keys of a product,
+    category, ... so they can be read or removed together.
+    Every write stamps the keys with a new version, removed keys stay behind with empty values so the other workers
+    see the removal when they catch up.
+    """
+    meta = {
+        'collection': 'translations',
+        'indexes': ['entity', 'version']
+    }
+    id: str = StringField(primary_key=True)
+    entity: str = StringField(required=False, null=True)
+    values: dict = DictField(required=False, default={})
+    version: int = IntField(default=0)
+
+    @classmethod
+    def load(cls):
+        """Fills the in-memory languages with the whole collection."""
+        languages.clear()
+        languages.load(cls._get_collection().find({}))
+
+    @classmethod
+    async def refresh(cls):
+        """Applies the translations written by other workers since the last load / refresh."""
+        cursor = collection(cls).find({'version': {'$gt': languages.version - translation_sync_overlap}})
+        languages.load([translation async for translation in cursor])
+
+    @classmethod
+    async def remove_entity(cls, entity):
+        """Empties every key of an entity ({id}_name, {id}_options_{index}, ...) in all languages at once."""
+        entity = str(entity)
+        version = await asyncio.get_running_loop().run_in_executor(None, translation_versions.next_value)
+        await collection(cls).update_many({'entity': entity}, {'$set': {'values': {}, 'version': version}})
+        languages.remove_entity(entity)
+
+    @classmethod
+    async def sync(cls):
+        while True:
+            await asyncio.sleep(translation_sync_interval)
+            try:
+                await cls.refresh()
+            except Exception:
+                # The next round catches up, the loop must outlive a failed refresh
+                logger.exception('Translation sync failed')
+
+    @classmethod
+    def migrate(cls) -> int:
+        """Moves the strings still stored in the language documents into the translations collection."""
+        batch = TranslationBatch()
+        for language in Language.objects(strings__ne={}):
+            batch.set(language.prefix, language.strings)
+        if not batch.updates:
+            return 0
+        batch.write(update_languages=False)
+        Language.objects(strings__ne={}).update(set__strings={})
+        return sum(len(strings) for strings in batch.updates.values())
+
+
+class TranslationBatch:
+    """
+    Buffers translation changes and applies them with a single unordered bulk write on the translations collection,
+    the in-memory languages of this worker are updated at the same time, the others catch up through sync.
+    write is for sync callers, the routes await flush.
+    """
+
+    def __init__(self):
+        self.updates = defaultdict(dict)
+        self.removals = defaultdict(set)
+
+    def set(self, prefix: str, strings: dict):
+        self.updates[prefix].update(strings)
+        self.removals[prefix].difference_update(strings)
+
+    def unset(self, prefix: str, keys: Iterable[str]):
+        keys = set(keys)
+        self.removals[prefix].update(keys)
+        for key in keys:
+            self.updates[prefix].pop(key, None)
+
+    def operations(self, version: int) -> list:
+        per_key = defaultdict(lambda: ({}, {}))
+        for prefix, strings in self.updates.items():
+            for key, value in strings.items():
+                per_key[key][0][f'values.{prefix}'] = value
+        for prefix, keys in self.removals.items():
+            for key in keys:
+                per_key[key][1][f'values.{prefix}'] = ''
+        operations = []
+        for key, (to_set, to_unset) in per_key.items():
+            update = {'$set': {'version': version, **to_set}, '$setOnInsert': {'entity': split_key(key)[0]}}
+            if to_unset:
+                update['$unset'] = to_unset
+            operations.append(UpdateOne({'_id': key}, update, upsert=bool(to_set)))
+        return operations
+
+    def __bool__(self):
+        return any(self.updates.values()) or any(self.removals.values())
+
+    def changes(self) -> Tuple[dict, dict]:
+        updates, removals = dict(self.updates), dict(self.removals)
+        self.updates, self.removals = defaultdict(dict), defaultdict(set)
+        return updates, removals
+
+    @staticmethod
+    def apply(updates: dict, removals: dict):
+        for prefix, strings in updates.items():
+            if strings:
+                languages.update_strings(prefix, strings)
+        for prefix, keys in removals.items():
+            if keys:
+                languages.remove_strings(prefix, keys)
+
+    def write(self, update_languages=True):
+        operations = self.operations(translation_versions.next_value()) if self else []
+        if operations:
+            TranslationModel._get_collection().bulk_write(operations, ordered=False)
+        updates, removals = self.changes()
+        if update_languages:
+            self.apply(updates, removals)
+
+    async def flush(self, update_languages=True):
+        operations = []
+        if self:
+            version = await asyncio.get_running_loop().run_in_executor(None, translation_versions.next_value)
+            operations = self.operations(version)
+        if operations:
+            await collection(TranslationModel).bulk_write(operations, ordered=False)
+        updates, removals = self.changes()
+        if update_languages:
+            self.apply(updates, removals)
+
+
+translation_versions = Sequence('translations')
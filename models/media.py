@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from os import makedirs
+from os.path import exists
+from typing import List, Tuple, Dict
+from uuid import uuid4
+
+import aiofiles.os
+from fastapi import Request
+from mongoengine import Document, StringField, IntField, DateTimeField, ListField, signals
+from pymongo import UpdateOne
+
+from config import media_dir, media_gc_grace_hours, media_gc_interval_hours, static_compressible
+from helpers.static import precompress
+from helpers.upload import store_upload, run_in_thread, remove_file
+from image import ResponsiveImage, alternatives
+
+
+# Fields of the product, category, attribute and settings documents that hold image paths
+image_fields = ('image', 'alt_image', 'attributes', 'options', 'front_page_images')
+# Images of the documents being saved as they were stored, by (collection, id), for post_save to diff
+stored_images: Dict[Tuple[str, object], Counter] = {}
+
+logger = logging.getLogger(__name__)
+
+
+def document_images(data: dict) -> Counter:
+    """The stored media paths a raw product, category, attribute or settings document points at."""
+    paths = Counter([data.get('image'), data.get('alt_image'), *(data.get('front_page_images') or [])])
+    paths.update(option.get('image') for option in data.get('options') or [])
+    for attribute in data.get('attributes') or []:
+        paths.update(option.get('image') for option in attribute.get('options') or [])
+    return Counter({path: count for path, count in paths.items() if path and path.startswith(f'{media_dir}/')})
+
+
+class MediaModel(Document):
+    """
+    A stored image, keyed by the SHA-256 of its content and served from an immutable path
+    (static/media/{sha[:2]}/{sha}_image.{extension}). The same content uploaded twice is stored and resized once.
+    The same content under another extension (.jpg / .jpeg) is another path of the blob.
+    refs counts the product, product / attribute option, category and settings images pointing at it,
+    it's kept up to date by the save / delete signals of those models (track_images).
+    """
+    meta = {
+        'collection': 'media',
+        'indexes': ['refs', 'paths', 'updated_at']
+    }
+    id: str = StringField(primary_key=True)
+    paths: List[str] = ListField(StringField())
+    refs: int = IntField(default=0)
+    created_at: datetime = DateTimeField(default=datetime.now)
+    # Last upload of this content, a blob re-uploaded during the grace period isn't collected
+    updated_at: datetime = DateTimeField(default=datetime.now)
+
+    @staticmethod
+    def path_for(digest: str, extension: str) -> str:
+        return f'{media_dir}/{digest[:2]}/{digest}_image.{extension.lower()}'
+
+    @classmethod
+    def register(cls, digest: str, path: str) -> bool:
+        """Records the blob, returns False when the content was already stored."""
+        now = datetime.now()
+        result = cls._get_collection().update_one({'_id': digest},
+                                                  {'$setOnInsert': {'refs': 0, 'created_at': now},
+                                                   '$set': {'updated_at': now}, '$addToSet': {'paths': path}},
+                                                  upsert=True)
+        return result.upserted_id is not None
+
+    @classmethod
+    def add_refs(cls, paths: Counter, sign: int = 1):
+        updates = [UpdateOne({'paths': path}, {'$inc': {'refs': sign * count}}) for path, count in paths.items()]
+        if updates:
+            cls._get_collection().bulk_write(updates, ordered=False)
+
+    @classmethod
+    def migrate(cls) -> int:
+        """Moves the single path of the blobs stored before paths into the list, then recounts the references."""
+        collection = cls._get_collection()
+        updates = [UpdateOne({'_id': blob.get('_id')},
+                             {'$addToSet': {'paths': blob.get('path')}, '$unset': {'path': ''}})
+                   for blob in collection.find({'path': {'$exists': True}}, {'path': 1})]
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+            cls.recount()
+        return len(updates)
+
+    @classmethod
+    async def store(cls, request: Request, max_bytes: int) -> Tuple[str, str, ResponsiveImage]:
+        """
+        Streams the uploaded file into the store and returns (path, sha256, responsive image).
+        The variants are only generated for content seen for the first time.
+        """
+        await run_in_thread(lambda: makedirs(f'{media_dir}/incoming', exist_ok=True))
+        filename, incoming, digest = await store_upload(
+            request, lambda name: f"{media_dir}/incoming/{uuid4().hex}.{name.rsplit('.', 1)[1]}", max_bytes)
+        extension = filename.rsplit('.', 1)[1]
+        path = cls.path_for(digest, extension)
+        responsive_image = ResponsiveImage(original_image=f'./{path}', fingerprint=f'{digest}_')
+        created = await run_in_thread(cls.register, digest, path)
+        if created or not exists(path):
+            await run_in_thread(lambda: makedirs(path.rsplit('/', 1)[0], exist_ok=True))
+            await aiofiles.os.rename(incoming, path)
+            if extension.lower() in static_compressible:
+                # Not a raster image (e.g. SVG), nothing to resize but worth compressing
+                await run_in_thread(precompress, path)
+            else:
+                responsive_image.create()
+        else:
+            await run_in_thread(remove_file, incoming)
+        return path, digest, responsive_image
+
+    @staticmethod
+    def image_models() -> list:
+        from models import ProductModel, CategoryModel, AttributeModel
+        from models.settings import SettingsModel
+        return [ProductModel, CategoryModel, AttributeModel, SettingsModel]
+
+    @classmethod
+    def references(cls) -> Counter:
+        """Every image path referenced by the catalog and the settings, reads all of them."""
+        paths = Counter()
+        for model in cls.image_models():
+            for data in model._get_collection().find({}, {field: True for field in image_fields}):
+                paths.update(document_images(data))
+        return paths
+
+    @classmethod
+    def referenced(cls, paths: List[str]) -> bool:
+        query = {'$or': [{'image': {'$in': paths}}, {'alt_image': {'$in': paths}},
+                         {'front_page_images': {'$in': paths}}, {'options.image': {'$in': paths}},
+                         {'attributes.options.image': {'$in': paths}}]}
+        return any(model._get_collection().find_one(query, {'_id': 1}) for model in cls.image_models())
+
+    @classmethod
+    def recount(cls):
+        """Rebuilds refs from the documents, repairs counts that drifted (e.g. writes that bypassed the signals)."""
+        references = cls.references()
+        collection = cls._get_collection()
+        updates = []
+        for blob in collection.find({}, {'paths': 1, 'refs': 1}):
+            refs = sum(references.get(path, 0) for path in blob.get('paths') or [])
+            if blob.get('refs') != refs:
+                updates.append(UpdateOne({'_id': blob.get('_id')}, {'$set': {'refs': refs}}))
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+
+    @staticmethod
+    def files(path: str) -> List[str]:
+        """The original, its variants, their modern format siblings and the precompressed copies."""
+        responsive_image = ResponsiveImage.from_path(path)
+        files = [path, *responsive_image.variants().values()]
+        return [file for original in files for file in [original, *alternatives(original).values()]] + \
+            [f'{path}.br', f'{path}.gz']
+
+    @classmethod
+    def collect_garbage(cls) -> List[str]:
+        """Removes the blobs without references past the grace period, returns the removed paths."""
+        collection = cls._get_collection()
+        cutoff = datetime.now() - timedelta(hours=media_gc_grace_hours)
+        unused = {'refs': {'$lte': 0}, 'updated_at': {'$lte': cutoff}}
+        removed = []
+        drifted = False
+        for blob in collection.find(unused, {'paths': 1}):
+            paths = blob.get('paths') or []
+            # A count that drifted must not cost a used image, the documents have the last word
+            if cls.referenced(paths):
+                drifted = True
+                continue
+            # Only deleted when it wasn't referenced or uploaded again in the meantime
+            if collection.delete_one({'_id': blob.get('_id'), **unused}).deleted_count:
+                for path in paths:
+                    for file in cls.files(f'./{path}'):
+                        remove_file(file)
+                removed += paths
+        if drifted:
+            cls.recount()
+        return removed
+
+    @classmethod
+    async def collect_periodically(cls):
+        while True:
+            try:
+                await run_in_thread(cls.collect_garbage)
+            except Exception:
+                logger.exception('Media garbage collection failed')
+            await asyncio.sleep(media_gc_interval_hours * 3600)
+
+
+def images_pre_save(sender, document, **kwargs):
+    if document.id and any(field.split('.')[0] in image_fields for field in document._get_changed_fields()):
+        stored = sender._get_collection().find_one({'_id': document.id}, {field: True for field in image_fields})
+        stored_images[(sender._get_collection_name(), document.id)] = document_images(stored or {})
+
+
+def images_post_save(sender, document, **kwargs):
+    key = (sender._get_collection_name(), document.id)
+    if key not in stored_images and not kwargs.get('created'):
+        return
+    before = stored_images.pop(key, Counter())
+    after = document_images(document.to_mongo())
+    MediaModel.add_refs(after - before)
+    MediaModel.add_refs(before - after, -1)
+
+
+def images_post_delete(sender, document, **kwargs):
+    MediaModel.add_refs(document_images(document.to_mongo()), -1)
+
+
+def track_images(model):
+    """Keeps MediaModel.refs in step with the image paths of model's documents."""
+    signals.pre_save.connect(images_pre_save, sender=model)
+    signals.post_save.connect(images_post_save, sender=model)
+    signals.post_delete.connect(images_post_delete, sender=model)
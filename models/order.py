@@ -1,16 +1,31 @@
 from datetime import datetime
+from functools import lru_cache
+from typing import List
 
+from bson import ObjectId
 from mongoengine import Document, ReferenceField, IntField, DecimalField, \
-    signals, StringField, EmbeddedDocumentListField, DateTimeField, BooleanField, DictField
+    StringField, EmbeddedDocumentListField, DateTimeField, BooleanField, DictField
+from mongoengine.connection import get_connection
 
-from config import free_shipping
+from config import free_shipping, order_number_block_size, invoice_number_block_size
+from exceptions import CartEmpty, ProductNotFound, ProductOutOfStock
+from helpers.db_helper_v2 import in_bulk, reference_id
 from models.base import Base
+from models.counter import Sequence
 from models.user import CartItem
 
 
+@lru_cache(maxsize=None)
+def supports_transactions() -> bool:
+    # Replica set members report a setName and mongos answers 'isdbgrid', a standalone server has neither
+    hello = get_connection().admin.command('ismaster')
+    return bool(hello.get('setName')) or hello.get('msg') == 'isdbgrid'
+
+
 class OrderModel(Document, Base):
     meta = {
-        'collection': 'orders'
+        'collection': 'orders',
+        'indexes': [('-number', '-id'), ('user', '-id')]
     }
 
     user = ReferenceField('UserModel')
@@ -26,26 +41,88 @@ class OrderModel(Document, Base):
     shipping_cost: float = DecimalField(default=5.00)
     is_invoice_generated: bool = BooleanField(default=False)
     last_updated_at_invoice: datetime = DateTimeField(required=False)
+    invoice_number: int = IntField(required=False)
+    # Rendering job, '' (never asked) -> queued -> done / failed
+    invoice_status: str = StringField(default='', choices=('', 'queued', 'done', 'failed'))
+    invoice_error: str = StringField(default='')
+    invoice_queued_at: datetime = DateTimeField(required=False)
     mb_reference = DictField(required=False)
     shipping_address = DictField(required=False)
     billing_address = DictField(required=False)
     payment_method: str = StringField(default='')
 
     @classmethod
-    def post_save(cls, _, document, **kwargs):
-        if kwargs.get('created'):
-            document.items = document.user.cart
-            document.created_at = datetime.now()
-            document.updated_at = datetime.now()
-            for item in document.user.cart:
-                document.amount += item.product.price * item.quantity
-                item.product.update_quantity(item)
-            if document.amount > free_shipping:
-                document.shipping_cost = 0
-            document.number = cls.count({})
-            document.save()
-            document.user.orders.append(document)
-            document.user.save()
-
-
-signals.post_save.connect(OrderModel.post_save, sender=OrderModel)
+    def last_number(cls) -> int:
+        last = cls.objects.only('number').order_by('-number').first()
+        return last.number if last else 0
+
+    @classmethod
+    def last_invoice_number(cls) -> int:
+        last = cls.objects(invoice_number__exists=True).only('invoice_number').order_by('-invoice_number').first()
+        return last.invoice_number if last else 0
+
+    def assign_invoice_number(self) -> int:
+        if not self.invoice_number:
+            self.invoice_number = invoice_numbers.next_value()
+        return self.invoice_number
+
+    @staticmethod
+    def assign_invoice_numbers(orders: List["OrderModel"]):
+        """assign_invoice_number for a batch, the missing numbers are taken from the counter at once."""
+        missing = [order for order in orders if not order.invoice_number]
+        for order, number in zip(missing, invoice_numbers.next_values(len(missing))):
+            order.invoice_number = number
+
+    @classmethod
+    def place(cls, user, payload: dict) -> "OrderModel":
+        """
+        Creates the order for the user's cart: prices it from one bulk product fetch, reserves the stock
+        atomically, takes the number from the orders counter and writes the order plus the user's reference.
+        Runs inside a transaction when the deployment supports them, otherwise the reserved stock is given back
+        if a later item can't be reserved.
+        """
+        from models.product import ProductModel
+        from models.user import UserModel
+        if not user.cart:
+            raise CartEmpty
+        products = in_bulk(ProductModel, [item._data.get('product') for item in user.cart])
+        now = datetime.now()
+        order = cls(id=ObjectId(), user=user.id, items=[], created_at=now, updated_at=now, **payload)
+        for item in user.cart:
+            product = products.get(str(reference_id(item._data.get('product'))))
+            if not product:
+                raise ProductNotFound(holder=(str(reference_id(item._data.get('product'))),))
+            order.items.append(CartItem(product=product, attributes=item.attributes, quantity=item.quantity))
+            order.amount += product.price * item.quantity
+        if order.amount > free_shipping:
+            order.shipping_cost = 0
+        order.validate()
+
+        def write(session=None):
+            reserved = []
+            try:
+                for item in order.items:
+                    if item.product.update_quantity(item, session=session) is None:
+                        raise ProductOutOfStock(holder=(item.product.name,))
+                    reserved.append(item)
+                order.number = order_numbers.next_value(session=session)
+                cls._get_collection().insert_one(order.to_mongo(), session=session)
+                UserModel._get_collection().update_one({'_id': user.id}, {'$push': {'orders': order.id}},
+                                                       session=session)
+            except Exception:
+                if session is None:
+                    for item in reserved:
+                        item.product.update_quantity(item, replenish_stock=True)
+                raise
+
+        if supports_transactions():
+            with get_connection().start_session() as session:
+                session.with_transaction(write)
+        else:
+            write()
+        user.orders.append(order)
+        return order
+
+
+order_numbers = Sequence('orders', seed=OrderModel.last_number, block_size=order_number_block_size)
+invoice_numbers = Sequence('invoices', seed=OrderModel.last_invoice_number, block_size=invoice_number_block_size)
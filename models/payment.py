@@ -10,7 +10,8 @@ status = ('pending', 'rejected', 'completed')
 
 class PaymentModel(Document, Base):
     meta = {
-        'collection': 'payments'
+        'collection': 'payments',
+        'indexes': ['order']
     }
 
     order = ReferenceField('OrderModel')
@@ -3,18 +3,23 @@ from typing import Optional, List, Union
 from bson import ObjectId
 from mongoengine import Document, ListField, ReferenceField, StringField, signals, DictField, DecimalField, \
     BooleanField, IntField
+from pymongo import ReturnDocument
 
 from helpers import convert_to_slug
+from helpers.cache import invalidate_on_change, catalog_cache
 from helpers.db_helper_v2 import find, count
 from models import ProductTypeModel
 from models.base import Base
 from models.category import CategoryModel
+from models.media import track_images
 from models.user import CartItem
 
 
 class ProductModel(Document, Base):
     meta = {
-        'collection': 'products'
+        'collection': 'products',
+        # Keyset pages sort on (name, _id), with or without a category filter
+        'indexes': [('name', 'id'), ('category', 'name', 'id'), 'slug']
     }
     name: str = StringField(required=True, max_length=70)
     description: Optional[str] = StringField(required=False, default="")
@@ -144,8 +149,8 @@ class ProductModel(Document, Base):
             self.category.parent_id.number_of_products -= 1
             self.category.parent_id.save()
 
-    @classmethod
-    def get_by_category(cls, param: Union[str, ObjectId]):
+    @staticmethod
+    def category_filter(param: Union[str, ObjectId]) -> Optional[dict]:
         if isinstance(param, ObjectId):
             cat: CategoryModel = CategoryModel.get_by_id(param)
         else:
@@ -155,7 +160,14 @@ class ProductModel(Document, Base):
                 temp = [category.id for category in cat.subcategories]
             else:
                 temp = [cat.id]
-            return find(cls, {'category__in': temp})
+            return {'category__in': temp}
+        return None
+
+    @classmethod
+    def get_by_category(cls, param: Union[str, ObjectId]):
+        payload = cls.category_filter(param)
+        if payload:
+            return find(cls, payload)
         return []
 
     async def add_image(self, image, **kwargs):
@@ -184,27 +196,72 @@ class ProductModel(Document, Base):
                 temp = [cat.id]
             return count(cls, {'category__in': temp})
 
-    def update_quantity(self, payload: CartItem, replenish_stock=False):
+    def _stock_update(self, options: List, quantity: int, replenish_stock: bool):
+        # quantities is either [{'name': option, 'option': stock}] or, for products with their own attributes,
+        # [{'name': option, 'option': [{'name': product type option, 'option': stock}]}]
+        nested = any(isinstance(variant.get('option'), list) for variant in self.quantities
+                     if variant.get('name') in options)
+        stock_filter = {'name': {'$in': options}}
+        if not replenish_stock:
+            stock_filter['option'] = {'$gte': quantity}
+        if nested:
+            query = {'quantities': {'$elemMatch': {'name': {'$in': options}, 'option': {'$elemMatch': stock_filter}}}}
+            path = 'quantities.$[variant].option.$[option].option'
+            array_filters = [{'variant.name': {'$in': options}},
+                             {f'option.{k}': v for k, v in stock_filter.items()}]
+        else:
+            query = {'quantities': {'$elemMatch': stock_filter}}
+            path = 'quantities.$[variant].option'
+            array_filters = [{f'variant.{k}': v for k, v in stock_filter.items()}]
+        return query, path, array_filters
+
+    @staticmethod
+    def _stock_level(quantities: List[dict], options: List):
+        for variant in quantities:
+            if variant.get('name') in options:
+                if not isinstance(variant.get('option'), list):
+                    return variant.get('option')
+                for item in variant.get('option'):
+                    if item.get('name') in options:
+                        return item.get('option')
+        return None
+
+    def update_quantity(self, payload: CartItem, replenish_stock=False, session=None) -> Optional[int]:
+        """
+        Decrements (or replenishes) the stock of the cart item variant with a single atomic $inc,
+        so concurrent checkouts can't overwrite each other and the stock can't go negative.
+        Returns the new stock level, or None when there isn't enough stock (nothing is changed then).
+        The document itself is not reloaded.
+        """
+        amount = payload.quantity if replenish_stock else -payload.quantity
         if len(payload.attributes) == 0:
-            if not replenish_stock:
-                self.quantity -= payload.quantity
-            else:
-                self.quantity += payload.quantity
+            query = {} if replenish_stock else {'quantity': {'$gte': payload.quantity}}
+            path = 'quantity'
+            array_filters = None
         else:
-            for index1, attribute in enumerate(self.quantities):
-                if attribute.get('name') in [item.get('option') for item in payload.attributes]:
-                    for a in payload.attributes:
-                        for index2, item in enumerate(attribute.get('option')):
-                            if a.get('option') == item.get('name'):
-                                if not replenish_stock:
-                                    self.quantities[index1]['option'][index2]['option'] -= payload.quantity
-                                else:
-                                    self.quantities[index1]['option'][index2]['option'] += payload.quantity
-        self.save()
+            options = [item.get('option') for item in payload.attributes]
+            query, path, array_filters = self._stock_update(options, payload.quantity, replenish_stock)
+        updated = self._get_collection().find_one_and_update(
+            {'_id': self.id, **query},
+            {'$inc': {path: amount}},
+            projection={'quantity': True, 'quantities': True},
+            array_filters=array_filters,
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if not updated:
+            return None
+        catalog_cache.invalidate(lambda key: key[0] == 'products')
+        if len(payload.attributes) == 0:
+            return updated.get('quantity')
+        return self._stock_level(updated.get('quantities', []), [item.get('option') for item in payload.attributes])
 
 
 signals.pre_save.connect(ProductModel.pre_save, sender=ProductModel)
 signals.post_save.connect(ProductModel.post_save, sender=ProductModel)
+signals.post_save.connect(invalidate_on_change, sender=ProductModel)
+signals.post_delete.connect(invalidate_on_change, sender=ProductModel)
+track_images(ProductModel)
 
 if __name__ == '__main__':
     c = ProductModel(
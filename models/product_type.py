@@ -2,12 +2,14 @@ from typing import Optional, List
 from mongoengine import Document, StringField, ListField, ReferenceField, signals
 
 from helpers import convert_to_slug
+from helpers.cache import invalidate_on_change
 from models.base import Base
 
 
 class ProductTypeModel(Document, Base):
     meta = {
-        'collection': 'product_types'
+        'collection': 'product_types',
+        'indexes': ['name', 'slug']
     }
     name: str = StringField(required=True, max_length=70)
     attributes: Optional[List] = ListField(ReferenceField('AttributeModel'), required=False,
@@ -30,6 +32,8 @@ class ProductTypeModel(Document, Base):
 
 
 signals.post_save.connect(ProductTypeModel.post_save, sender=ProductTypeModel)
+signals.post_save.connect(invalidate_on_change, sender=ProductTypeModel)
+signals.post_delete.connect(invalidate_on_change, sender=ProductTypeModel)
 
 if __name__ == '__main__':
     c = ProductTypeModel(
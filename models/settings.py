@@ -3,6 +3,7 @@ from typing import Optional, List
 from mongoengine import Document, ListField, StringField, BooleanField
 
 from models.base import Base
+from models.media import track_images
 
 
 class SettingsModel(Document, Base):
@@ -13,3 +14,6 @@ class SettingsModel(Document, Base):
     front_page_images: Optional[List[str]] = ListField(StringField(required=False), required=False, default=[])
     front_page_video: Optional[List[str]] = StringField(required=False, default='')
     front_page_is_video: bool = BooleanField(required=True, default=False)
+
+
+track_images(SettingsModel)
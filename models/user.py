@@ -1,4 +1,5 @@
 from os import getenv
+from typing import Optional
 from uuid import uuid4
 
 from fastapi import Depends, HTTPException, status
@@ -8,9 +9,11 @@ from jose.jwt import decode
 from mongoengine import EmbeddedDocument, StringField, Document, EmailField, ReferenceField, IntField, \
     EmbeddedDocumentListField, signals, ListField, BooleanField, DictField
 
-from auth import verify_password, oauth2_scheme, SECRET_KEY, ALGORITHM, TokenData, get_password_hash
-from config import domain, IBAN
+from auth import verify_password_async, oauth2_scheme, SECRET_KEY, ALGORITHM, TokenData
+from config import domain, principal_cache_ttl, principal_cache_max_entries
 from helpers import send_email
+from helpers.cache import TTLCache
+from helpers.db_helper_async import get_one as get_one_async, collection
 from helpers.db_helper_v2 import get_one
 from invoice import currencies
 from languages.errors.messages import translations
@@ -36,6 +39,7 @@ class CartItem(EmbeddedDocument):
 class UserModel(Document, Base):
     meta = {
         'collection': 'users',
+        'indexes': ['email', 'activation_token', 'reset_password_token'],
     }
     first_name: str = StringField(required=True, max_length=70, min_length=1)
     last_name: str = StringField(required=True, max_length=70, min_length=1)
@@ -52,11 +56,6 @@ class UserModel(Document, Base):
     reset_password_token: str = StringField(default='')
     preferred_language: str = StringField(default='pt')
 
-    @classmethod
-    def post_init(cls, _, document):
-        if not document.id:
-            document.password = get_password_hash(document.password)
-
     @classmethod
     def get_by_email(cls, email):
         return get_one(cls, {'email': email})
@@ -76,17 +75,13 @@ class UserModel(Document, Base):
 
     # Send Bank Transfer Details:
     def send_bank_transfer_details(self, locale, order):
-        from templates.email.bank_transfer_email import translations, html
+        from templates.email.bank_transfer_email import translations, templates
         translations_object = translations.get(locale)
-        formatted_template = html.format(
+        formatted_template = templates.get(locale).render(
             greeting=translations_object.get('greeting').format(f'{self.first_name} {self.last_name}'),
-            line_1=translations_object.get('line_1'),
-            iban=IBAN,
-            amount=translations_object.get('amount'),
             amount_value=str(format(float(order.shipping_cost) + float(order.amount), ".2f")),
             currency=currencies.get(order.currency),
             line_2=translations_object.get('line_2').format(order),
-            button_label=translations_object.get('button_label'),
             order_url=f'http://localhost:8080/user/order_history?order_id={order.id}' if getenv('ENVIRONMENT') == 'dev'
             else f'https://{domain}/user/order_history?order_id={order.id}'
         )
@@ -161,16 +156,15 @@ class UserModel(Document, Base):
 
     async def create_order(self):
         from models.order import OrderModel
-        self.orders.append(OrderModel(user=self, items=self.cart))
-        self.save()
+        return OrderModel.place(self, {})
 
     # Auth
     @classmethod
-    def authenticate_user(cls, email: str, password: str):
-        user = cls.get_by_email(email)
+    async def authenticate_user(cls, email: str, password: str):
+        user = await get_one_async(cls, {'email': email})
         if not user:
             return False
-        if not verify_password(password, user.password):
+        if not await verify_password_async(password, user.password):
             return False
         return user
 
@@ -194,7 +188,7 @@ class UserModel(Document, Base):
             token_data = TokenData(scopes=token_scopes, email=email)
         except JWTError:
             raise credentials_exception
-        user = cls.get_by_email(email=token_data.email)
+        user = await CurrentUser.load(token_data.email)
         if user is None:
             raise credentials_exception
         for scope in security_scopes.scopes:
@@ -207,7 +201,72 @@ class UserModel(Document, Base):
         return user
 
 
-signals.post_init.connect(UserModel.post_init, sender=UserModel)
+class CurrentUser:
+    """
+    Authenticated principal: a slim projection of the user, cached per token subject for a short time.
+    Any other field or method loads (once) and delegates to the full UserModel document.
+    """
+    slim_fields = ('email', 'role', 'active', 'first_name', 'last_name', 'preferred_language')
+
+    def __init__(self, data: dict):
+        self.__dict__['_document'] = None
+        self.__dict__['id'] = data.get('_id')
+        self.__dict__.update({field: data.get(field) for field in self.slim_fields})
+
+    @classmethod
+    async def load(cls, email: str) -> Optional["CurrentUser"]:
+        async def load_principal():
+            projection = {field: True for field in cls.slim_fields}
+            data = await collection(UserModel).find_one({'email': email}, projection=projection)
+            return cls(data) if data is not None else None
+
+        # A save / delete of the user while loading bumps the cache generation and the stale principal isn't stored
+        principal = await principal_cache.get_or_load(email, load_principal)
+        if principal is None:
+            return None
+        # The cached principal is shared, each request gets its own copy to load the document into
+        return cls({'_id': principal.id, **{field: getattr(principal, field) for field in cls.slim_fields}})
+
+    @property
+    def document(self) -> UserModel:
+        if self._document is None:
+            self.__dict__['_document'] = UserModel.get_by_id(self.id)
+        return self._document
+
+    def __getattr__(self, name):
+        return getattr(self.document, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.document, name, value)
+        if name in self.slim_fields:
+            self.__dict__[name] = value
+
+
+principal_cache = TTLCache(principal_cache_ttl, principal_cache_max_entries)
+
+
+# Ids of the users being saved with a change to what the cached principal holds
+principal_changes = set()
+
+
+def principal_pre_save(sender, document, **kwargs):
+    if document.id and {'email', 'password', *CurrentUser.slim_fields} & set(document._get_changed_fields()):
+        principal_changes.add(document.id)
+
+
+def principal_post_save(sender, document, **kwargs):
+    if document.id in principal_changes:
+        principal_changes.discard(document.id)
+        principal_cache.invalidate_items(lambda email, principal: principal.id == document.id)
+
+
+def principal_post_delete(sender, document, **kwargs):
+    principal_cache.invalidate_items(lambda email, principal: principal.id == document.id)
+
+
+signals.pre_save.connect(principal_pre_save, sender=UserModel)
+signals.post_save.connect(principal_post_save, sender=UserModel)
+signals.post_delete.connect(principal_post_delete, sender=UserModel)
 
 if __name__ == '__main__':
     u = UserModel.get_by_email('random_email@domain.com')
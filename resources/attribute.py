@@ -1,7 +1,10 @@
 from typing import Optional
-from fastapi import APIRouter, status, Cookie, UploadFile, File, Security
+from fastapi import APIRouter, status, Cookie, Security, Request
 
 from exceptions import OutputError, AttributeNotUnique, AttributeNotFound
+from helpers.cache import catalog_cache
+from helpers.db_helper_async import get_all
+from helpers.snapshot import Snapshot
 from models.attribute import AttributeModel
 from models.base import OID
 from models.user import UserModel
@@ -24,8 +27,12 @@ attribute_list_schema = AttributeSchema(many=True)
                     "description": "Validation Error"
                 }
             })
-async def get_attributes(locale: Optional[str] = Cookie('pt')):
-    return attribute_list_schema.dump(AttributeModel.get_all())
+async def get_attributes(request: Request, locale: Optional[str] = Cookie('pt')):
+    async def load():
+        return Snapshot.from_data(attribute_list_schema.dump(await get_all(AttributeModel)))
+
+    snapshot = await catalog_cache.get_or_load(('attributes',), load)
+    return snapshot.response(request)
 
 
 @router.get("/attributes/{_id}", status_code=status.HTTP_200_OK,
@@ -60,9 +67,10 @@ async def create_attribute(attribute: dict, locale: Optional[str] = Cookie('pt')
                      "description": "Validation Error"
                  }
              })
-async def create_upload_file(_id: OID, option_name, file: UploadFile = File(...),
-                             current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
-    return await uploader(AttributeModel, 'attributes', _id, file, option=option_name)
+async def create_upload_file(_id: OID, option_name, request: Request,
+                             current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"]),
+                             locale: Optional[str] = Cookie('pt')):
+    return await uploader(AttributeModel, _id, request, option=option_name, locale=locale)
 
 
 @router.patch("/attributes/{_id}", status_code=status.HTTP_200_OK,
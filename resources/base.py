@@ -1,25 +1,23 @@
-import asyncio
 from datetime import datetime
-from os import mkdir, listdir, remove
-from os.path import exists, join, isfile
-from shutil import copyfileobj
 from typing import List, Callable, Union
 
 from bson import ObjectId
-from fastapi import status, UploadFile
+from fastapi import status, Request
 from fastapi.responses import JSONResponse
 from marshmallow import ValidationError
 
-from auth import get_password_hash
-from config import available_languages
-from exceptions import Error
-from helpers.db_helper_v2 import find
-from image import ResponsiveImage
-from languages import languages
+from auth import get_password_hash_async
+from config import available_languages, max_rows, upload_max_image_bytes, upload_max_video_bytes, media_dir
+from exceptions import Error, UploadTooLarge, InvalidCursor, InvalidUpload
+from helpers.cache import invalidate_model
+from helpers.db_helper_async import get_one, find, save, delete
+from helpers.upload import store_upload, run_in_thread, prepare_directory, remove_file
+from image import alternatives
 from languages.errors.messages import translations
 from languages.general_messages.messages import general_messages
 from models.base import OID
-from models.language import Language
+from models.language import TranslationBatch, TranslationModel
+from models.media import MediaModel
 
 
 def contains(element, *typ):
@@ -29,56 +27,60 @@ def contains(element, *typ):
     return False
 
 
-async def translations_helper(field: str, element, locale: str):
+async def translations_helper(field: str, element, locale: str, batch: TranslationBatch = None):
+    # Without a batch the strings are written right away, otherwise the caller flushes them
+    own_batch = batch is None
+    batch = TranslationBatch() if own_batch else batch
     if (isinstance(getattr(element, field), str) or not getattr(element, field)
             and not isinstance(getattr(element, field), list)):
-        tasks = []
         for lang in available_languages:
-            task = asyncio.ensure_future(lang_iterator(lang, locale, element, field))
-            tasks.append(task)
-        await asyncio.gather(*tasks)
+            lang_iterator(batch, lang, locale, element, field)
     else:
         values = [value.name for value in getattr(element, field)]
         if contains(values, float, int):
             pass
         else:
             for index, child_element in enumerate(getattr(element, field)):
-                tasks = []
                 for lang in available_languages:
-                    task = asyncio.ensure_future(lang_iterator_with_dict(lang, locale,
-                                                                         element, field, child_element, index))
-                    tasks.append(task)
-                await asyncio.gather(*tasks)
+                    lang_iterator_with_dict(batch, lang, locale, element, field, child_element, index)
+    if own_batch:
+        await batch.flush()
 
 
-async def lang_iterator(lang, locale, element, field):
-    db_language = Language.get_language(lang)
+def lang_iterator(batch: TranslationBatch, lang, locale, element, field):
     if lang == locale:
         temp_translations = {f'{element.id}_{field}': getattr(element, field)}
     else:
         temp_translations = {f'{element.id}_{field}': None}
-    db_language.add_strings(temp_translations)
-    languages.update_strings(lang, temp_translations)
+    batch.set(lang, temp_translations)
 
 
-async def lang_iterator_with_dict(lang, locale, element, field, child_element, index):
-    db_language = Language.get_language(lang)
+def lang_iterator_with_dict(batch: TranslationBatch, lang, locale, element, field, child_element, index):
     if child_element:
         if lang == locale:
             temp_translations = {
                 f'{element.id}_{field}_{index}': child_element.name}
         else:
             temp_translations = {f'{element.id}_{field}_{index}': ""}
-        db_language.add_strings(temp_translations)
-        languages.update_strings(lang, temp_translations)
+        batch.set(lang, temp_translations)
+
+
+def page_size(limit: Union[int, None]) -> int:
+    return max(1, min(limit or max_rows, 100))
+
+
+def invalid_cursor(e: InvalidCursor, locale: str) -> JSONResponse:
+    e.msg_template = translations.get(locale).get(e.code) if translations.get(locale).get(e.code) \
+        else e.msg_template
+    return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content={"error": e.message()})
 
 
 async def getter(model, schema, _id, exception, locale):
     try:
         if model.__name__ != 'PaymentModel':
-            obj = model.get_by_id(_id)
+            obj = await get_one(model, {'id': _id})
         else:
-            obj = model.get_by_custom_field('order', _id)
+            obj = await get_one(model, {'order': _id})
         if not obj:
             raise exception
     except exception as e:
@@ -100,21 +102,22 @@ async def creator(model, schema, element, exception, locale, late_fields: dict =
             for field, value in late_fields.items():
                 setattr(obj, field, value)
         if model.__name__ not in ['UserModel', 'OrderModel']:
-            if model.get_by_name(obj.name):
+            if await get_one(model, {'name': obj.name}):
                 raise exception
         elif model.__name__ == 'UserModel':
-            if model.get_by_email(obj.email):
+            if await get_one(model, {'email': obj.email}):
                 raise exception
+            obj.password = await get_password_hash_async(obj.password)
             # obj.send_verification_email(locale)
         else:
             pass
-        obj.save()
-        tasks = []
+        await save(obj)
+        invalidate_model(model)
         if hasattr(obj, 'translations'):
+            batch = TranslationBatch()
             for field in obj.translations:
-                task = asyncio.ensure_future(translations_helper(field, obj, locale))
-                tasks.append(task)
-            await asyncio.gather(*tasks)
+                await translations_helper(field, obj, locale, batch)
+            await batch.flush()
         return schema.dump(obj)
     except ValidationError as e:
         return JSONResponse(status_code=400, content=e.messages)
@@ -137,17 +140,17 @@ async def updater(model, schema, _id, payload: dict, exception, locale,
     if ignore_fields is None:
         ignore_fields = []
     try:
-        obj: model = model.get_by_id(_id)
+        obj: model = await get_one(model, {'id': _id})
         if model.__name__ == 'PaymentModel' and 'status' in payload:
             if payload.get('status') == 'completed':
                 obj.order.status = 'done'
             else:
                 obj.order.status = 'awaiting_payment'
-            obj.order.save()
+            await save(obj.order)
         if not obj:
             raise exception
         if model.__name__ == 'UserModel' and 'password' in payload:
-            setattr(obj, 'password', get_password_hash(payload.get('password')))
+            setattr(obj, 'password', await get_password_hash_async(payload.get('password')))
             payload.pop('password', None)
         if model.__name__ == 'UserModel' and 'addresses' in payload:
             from models.user import AddressModel
@@ -155,7 +158,6 @@ async def updater(model, schema, _id, payload: dict, exception, locale,
         if model.__name__ == 'OrderModel' and 'status' in payload:
             for item in obj.items:
                 item.product.update_quantity(item, replenish_stock=True)
-                item.product.save()
         for k, v in payload.items():
             if slot:
                 obj = await slot(obj, payload, locale)
@@ -172,8 +174,9 @@ async def updater(model, schema, _id, payload: dict, exception, locale,
                 setattr(obj, k, v)
         if force_model:
             for field, _class in force_model.items():
-                setattr(obj, field, _class.get_by_id(payload.get(field)))
-        obj.save()
+                setattr(obj, field, await get_one(_class, {'id': payload.get(field)}))
+        await save(obj)
+        invalidate_model(model)
         # if model.__name__ == 'ProductModel' and 'product_type' in payload:
         #     obj.product_type_update()
     except exception as e:
@@ -190,16 +193,14 @@ async def updater(model, schema, _id, payload: dict, exception, locale,
 
 async def deleter(model, _id, exception, locale, success_message, is_product=False):
     try:
-        obj: model = model.get_by_id(_id)
+        obj: model = await get_one(model, {'id': _id})
         if not obj:
             raise exception
         if is_product:
             obj.helper_delete()
-        for language in Language.get_all():
-            for field in obj.translations:
-                language.strings.pop(f'{obj.id}_{field}')
-            language.save()
-        obj.delete()
+        await TranslationModel.remove_entity(obj.id)
+        await delete(obj)
+        invalidate_model(model)
     except exception as e:
         e.msg_template = translations.get(locale).get(e.code) if translations.get(locale).get(e.code) \
             else e.msg_template
@@ -214,7 +215,7 @@ async def deleter(model, _id, exception, locale, success_message, is_product=Fal
 
 async def finder(model, payload, locale):
     try:
-        objs = find(model, payload)
+        objs = await find(model, payload)
         return objs
     except Error as e:
         e.msg_template = translations.get(locale).get(e.code) if translations.get(locale).get(e.code) \
@@ -222,74 +223,68 @@ async def finder(model, payload, locale):
         return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"error": "Unexpected error"})
 
 
-async def uploader(model, model_name: str, _id: Union[OID, None], file: UploadFile, option=None, attr_name=None,
-                   option_name=None):
-    path = f'./static/{model_name}/{_id}' if not option else f'./static/{model_name}/{_id}/{option}'
-    fingerprint = datetime.now().strftime("%d_%m_%Y_%H_%M_%S_")
-    if attr_name and option_name:
-        path = f'./static/{model_name}/{_id}/{attr_name}/{option_name}'
-    if not exists(path) and not option and not attr_name:
-        mkdir(path)
-    elif not exists(path) and option:
-        if not exists(f'./static/{model_name}/{_id}'):
-            mkdir(f'./static/{model_name}/{_id}')
-        if not exists(path):
-            mkdir(path)
-    elif not exists(path) and attr_name:
-        if not exists(f'./static/{model_name}/{_id}'):
-            mkdir(f'./static/{model_name}/{_id}')
-        if not exists(f'./static/{model_name}/{_id}/{attr_name}'):
-            mkdir(f'./static/{model_name}/{_id}/{attr_name}')
-        if not exists(path):
-            mkdir(path)
-    else:
-        for f in listdir(path):
-            if isfile(join(path, f)):
-                remove(join(path, f))
-    extension = file.filename.rsplit('.', 1)[1]
-    with open(f"{path}/{fingerprint}image.{extension}", "wb") as buffer:
-        copyfileobj(file.file, buffer)
-    responsive_image = ResponsiveImage(original_image=f"{path}/{fingerprint}"
-                                                      f"image.{extension}",
-                                       fingerprint=fingerprint)
-    await responsive_image.create()
+async def uploader(model, _id: Union[OID, None], request: Request, option=None, attr_name=None, option_name=None,
+                   locale: str = 'pt'):
     obj = model.get_by_id(_id)
     if not obj:
         return {
             'message': f"The id '{_id}' was not found."
         }
-    elif not attr_name:
-        await obj.add_image(f'{path.replace("./", "")}/{fingerprint}'
-                            f'image.{extension}', option_name=option)
+    try:
+        image, digest, responsive_image = await MediaModel.store(request, upload_max_image_bytes)
+    except UploadTooLarge as e:
+        return too_large(e, locale)
+    except InvalidUpload as e:
+        return invalid_upload(e, locale)
+    if not attr_name:
+        await obj.add_image(image, option_name=option)
     else:
-        await obj.add_attribute_image(f'{path.replace("./", "")}/{fingerprint}'
-                                      f'image.{extension}', attr_name, option_name)
-    return {"message": 'success'}
+        await obj.add_attribute_image(image, attr_name, option_name)
+    invalidate_model(model)
+    # The variants are still being generated, GET /images/status reports when they are ready
+    return {"message": 'success', 'image': image, 'sha256': digest, 'variants': responsive_image.status()}
+
+
+def too_large(e: UploadTooLarge, locale: str):
+    e.msg_template = translations.get(locale).get(e.code) if translations.get(locale).get(e.code) \
+        else e.msg_template
+    return JSONResponse(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, content={"error": e.message()})
+
+
+def invalid_upload(e: InvalidUpload, locale: str):
+    e.msg_template = translations.get(locale).get(e.code) if translations.get(locale).get(e.code) \
+        else e.msg_template
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"error": e.message()})
 
 
-async def settings_uploader(file: UploadFile, settings_video: bool):
+async def settings_uploader(request: Request, settings_video: bool, locale: str = 'pt'):
     from models.settings import SettingsModel
     settings = SettingsModel.get_all()[0]
-    extension = file.filename.rsplit('.', 1)[1]
     fingerprint = datetime.now().strftime("%d_%m_%Y_%H_%M_%S_%f_")
     if not settings_video:
-        path = f'./static/settings/images'
-        with open(f"{path}/{fingerprint}image.{extension}", "wb") as buffer:
-            copyfileobj(file.file, buffer)
-        responsive_image = ResponsiveImage(original_image=f"{path}/{fingerprint}"
-                                                          f"image.{extension}",
-                                           fingerprint=fingerprint)
-        await responsive_image.create()
-        settings.front_page_images.append(f'{path.replace("./", "")}/{fingerprint}'
-                                          f'image.{extension}')
+        try:
+            image, digest, responsive_image = await MediaModel.store(request, upload_max_image_bytes)
+        except UploadTooLarge as e:
+            return too_large(e, locale)
+        except InvalidUpload as e:
+            return invalid_upload(e, locale)
+        settings.front_page_images.append(image)
         settings.front_page_is_video = False
+        settings.save()
+        return {"message": 'success', 'image': image, 'sha256': digest, 'variants': responsive_image.status()}
     else:
         path = f'./static/settings/video'
-        settings.front_page_video = f'{path.replace("./", "")}/{fingerprint}video.{extension}'
-        with open(f'{path}/{fingerprint}video.{extension}', "wb") as buffer:
-            copyfileobj(file.file, buffer)
+        try:
+            _, video, digest = await store_upload(
+                request, lambda name: f"{path}/{fingerprint}video.{name.rsplit('.', 1)[1]}", upload_max_video_bytes)
+        except UploadTooLarge as e:
+            return too_large(e, locale)
+        except InvalidUpload as e:
+            return invalid_upload(e, locale)
+        settings.front_page_video = video.replace('./', '', 1)
         settings.front_page_is_video = True
     settings.save()
+    return {"message": 'success', 'video': settings.front_page_video, 'sha256': digest}
 
 
 async def settings_remover(paths: List[str], settings_video: bool):
@@ -298,18 +293,18 @@ async def settings_remover(paths: List[str], settings_video: bool):
     sizes = ['', '-1x', '-2x', '-3x', '-4x']
     if settings_video:
         path = f'./static/settings/video'
-        for f in listdir(path):
-            if isfile(join(path, f)):
-                remove(join(path, f))
+        await run_in_thread(prepare_directory, path)
         settings.front_page_video = ''
     else:
         if paths:
             for path in paths:
                 i = path.find('.')
                 settings.front_page_images.remove(path)
+                if path.startswith(f'{media_dir}/'):
+                    # Stored media can be shared, MediaModel.collect_garbage removes it once unused
+                    continue
                 for size in sizes:
-                    try:
-                        remove(f'./{path[:i]}{size}{path[i:]}')
-                    except FileNotFoundError:
-                        pass
+                    variant = f'./{path[:i]}{size}{path[i:]}'
+                    for file in [variant, *alternatives(variant).values()]:
+                        await run_in_thread(remove_file, file)
     settings.save()
@@ -1,9 +1,12 @@
 from typing import Optional, List, Union, Any
-from fastapi import APIRouter, status, Cookie, UploadFile, File, Query, Security
+from fastapi import APIRouter, status, Cookie, Query, Security, Request
 from fastapi.responses import JSONResponse
 from starlette.responses import Response
 
 from exceptions import OutputError, CategoryNotUnique, Error, CategoryNotFound
+from helpers.cache import catalog_cache
+from helpers.db_helper_async import get_all
+from helpers.snapshot import Snapshot
 from languages.errors.messages import translations
 from languages.general_messages.messages import general_messages
 from models.base import OID
@@ -28,20 +31,25 @@ category_list_schema = CategorySchema(many=True)
                     "description": "Validation Error"
                 }
             })
-async def get_categories(locale: Optional[str] = Cookie('pt'), compact: int = 0,
+async def get_categories(request: Request, locale: Optional[str] = Cookie('pt'), compact: int = 0,
                          by_name: int = 0, filter_categories: Optional[List[str]] = Query(None)):
-    categories: Union[List[CategoryModel], list[dict[str, Union[str, Any]]]] = CategoryModel.get_all()
-    if compact:
-        filtered_categories = [cat for cat in categories if not cat.parent_id]
-        return category_list_schema.dump(filtered_categories)
-    elif filter_categories:
-        categories = await finder(CategoryModel, {
-            'id__in': filter_categories
-        }, locale)
-    elif by_name:
-        categories = [{'name': category.name,
-                       'id': category.id} for category in categories]
-    return category_list_schema.dump(categories)
+    async def load():
+        categories: Union[List[CategoryModel], list[dict[str, Union[str, Any]]]] = await get_all(CategoryModel)
+        if compact:
+            filtered_categories = [cat for cat in categories if not cat.parent_id]
+            return Snapshot.from_data(category_list_schema.dump(filtered_categories))
+        elif filter_categories:
+            categories = await finder(CategoryModel, {
+                'id__in': filter_categories
+            }, locale)
+        elif by_name:
+            categories = [{'name': category.name,
+                           'id': category.id} for category in categories]
+        return Snapshot.from_data(category_list_schema.dump(categories))
+
+    key = ('categories', bool(compact), bool(by_name), tuple(sorted(filter_categories or [])))
+    snapshot = await catalog_cache.get_or_load(key, load)
+    return snapshot.response(request)
 
 
 @router.get("/categories/{_id}", status_code=status.HTTP_200_OK,
@@ -76,9 +84,10 @@ async def create_category(category: dict, locale: Optional[str] = Cookie('pt'),
                      "description": "Validation Error"
                  }
              })
-async def create_upload_file(response: Response, _id: OID, file: UploadFile = File(...),
-                             current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
-    return await uploader(CategoryModel, 'categories', _id, file)
+async def create_upload_file(response: Response, _id: OID, request: Request,
+                             current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"]),
+                             locale: Optional[str] = Cookie('pt')):
+    return await uploader(CategoryModel, _id, request, locale=locale)
 
 
 @router.patch("/categories/{_id}", status_code=status.HTTP_200_OK,
@@ -0,0 +1,61 @@
+from os.path import normpath, isfile
+from typing import Optional
+
+from fastapi import APIRouter, status, HTTPException, Request, Query
+from fastapi.responses import FileResponse
+
+from config import image_formats, image_max_width, image_default_quality, image_resize_widths, \
+    image_resize_qualities
+from image import ResponsiveImage, encodable_formats
+from image.cache import variant_cache
+
+router = APIRouter(
+    tags=["images"],
+)
+
+resizable = ('jpg', 'jpeg', 'png', 'webp', 'avif', 'gif', 'bmp', 'tiff')
+
+
+def snap_width(width: int) -> int:
+    """The smallest allowed width covering the one asked."""
+    return next((allowed for allowed in image_resize_widths if allowed >= width), image_resize_widths[-1])
+
+
+def snap_quality(quality: int) -> int:
+    return min(image_resize_qualities, key=lambda allowed: abs(allowed - quality))
+
+
+def static_path(path: str) -> str:
+    path = normpath(path.lstrip('/'))
+    if not path.startswith('static/'):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not found')
+    return path
+
+
+@router.get("/images/status", status_code=status.HTTP_200_OK)
+async def get_image_status(path: str):
+    return {'image': path, 'variants': ResponsiveImage.from_path(f'./{static_path(path)}').status()}
+
+
+@router.get("/images/resize", status_code=status.HTTP_200_OK)
+async def resize_image(request: Request, path: str, width: int = Query(..., gt=0, le=image_max_width),
+                       format: Optional[str] = None, quality: int = Query(image_default_quality, gt=0, le=100)):
+    original_image = static_path(path)
+    extension = original_image.rsplit('.', 1)[-1].lower()
+    if extension not in resizable or not isfile(original_image):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not found')
+    formats = encodable_formats()
+    headers = {'Cache-Control': 'public, max-age=86400'}
+    if format:
+        # jpeg and jpg are the same variant
+        format = 'jpg' if format.lower() == 'jpeg' else format.lower()
+        if format not in ('jpg', 'jpeg', 'png', *formats):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Format '{format}' not supported")
+    else:
+        # No format asked, the best one the client accepts
+        accept = request.headers.get('accept', '')
+        format = next((option for option in image_formats if option in formats and f'image/{option}' in accept),
+                      {'jpg': 'jpg', 'jpeg': 'jpg'}.get(extension, 'png'))
+        headers['Vary'] = 'Accept'
+    target = await variant_cache.get(original_image, snap_width(width), format, snap_quality(quality))
+    return FileResponse(target, headers=headers)
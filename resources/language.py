@@ -3,6 +3,7 @@ from fastapi.responses import JSONResponse
 
 from exceptions import Error, OutputError
 from languages import languages
+from models.base import OID
 from models.language import Language
 
 router = APIRouter(
@@ -21,8 +22,7 @@ async def add_update_language(language: dict, response: Response, background_tas
     try:
         db_language = Language.get_language(language.get('prefix'))
         if db_language:
-            db_language.add_strings(language.get('strings'))
-            background_tasks.add_task(languages.update_strings, language.get('prefix'), language.get('strings'))
+            await db_language.add_strings(language.get('strings'))
             response.status_code = status.HTTP_200_OK
             return db_language
         else:
@@ -30,3 +30,8 @@ async def add_update_language(language: dict, response: Response, background_tas
     except Error as e:
         return JSONResponse(status_code=422, content={"error": e.message(language.get('prefix'))})
     return language
+
+
+@router.get("/languages/{prefix}/{_id}", status_code=status.HTTP_200_OK)
+async def get_entity_strings(prefix: str, _id: OID):
+    return languages.get_entity(prefix, _id)
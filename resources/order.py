@@ -1,16 +1,23 @@
+import asyncio
 from datetime import datetime
 from os import getcwd
 from os.path import join
 from typing import Optional
 
-from fastapi import Depends, Cookie, APIRouter, status, Security
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import Depends, Cookie, APIRouter, status, Security, Response
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 
-from exceptions import OutputError, OrderNotFound, PaymentNotFound
-from invoice import generate_invoice, send_invoice
+from exceptions import OutputError, OrderNotFound, PaymentNotFound, CartEmpty, ProductNotFound, ProductOutOfStock, \
+    InvalidCursor
+from helpers.db_helper_async import get_one, find
+from helpers.db_helper_v2 import reference_id
+from invoice import send_invoice
+from invoice.export import export_invoices
+from invoice.jobs import queue_invoice, expire_invoice_job
+from languages.errors.messages import translations
 from models import UserModel, OrderModel, PaymentModel
 from models.base import OID
-from resources.base import creator, getter, updater
+from resources.base import getter, updater, page_size, invalid_cursor
 from schemas.order import OrderSchema
 
 router = APIRouter(
@@ -32,14 +39,19 @@ order_schema_individual = OrderSchema(many=False)
              })
 async def create_order(payload: dict, locale: Optional[str] = Cookie('pt'),
                        current_user: UserModel = Depends(UserModel.get_current_user)):
-    order = {'user': current_user.id,
-             'shipping_address': payload.get('shipping_address'),
+    order = {'shipping_address': payload.get('shipping_address'),
              'billing_address': payload.get('billing_address'),
              'payment_method': payload.get('payment_method'),
              }
     if 'nif' in payload:
         order['nif'] = payload.get('nif')
-    return await creator(OrderModel, order_schema, order, Exception, locale)
+    try:
+        placed_order = await asyncio.get_running_loop().run_in_executor(None, OrderModel.place, current_user, order)
+    except (CartEmpty, ProductNotFound, ProductOutOfStock) as e:
+        e.msg_template = translations.get(locale).get(e.code) if translations.get(locale).get(e.code) \
+            else e.msg_template
+        return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"error": e.message()})
+    return order_schema.dump(placed_order)
 
 
 @router.patch("/orders/cancel",
@@ -72,12 +84,18 @@ async def cancel_order(payload: dict, locale: Optional[str] = Cookie('pt'),
                     "description": "Validation Error"
                 }
             })
-async def get_orders(locale: Optional[str] = Cookie('pt'), page: Optional[int] = None,
+async def get_orders(response: Response, locale: Optional[str] = Cookie('pt'), cursor: Optional[str] = None,
+                     limit: Optional[int] = None,
                      current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
-    if not page:
+    if not cursor and not limit:
         orders = OrderModel.get_all(field='number', reverse=True)
     else:
-        orders = OrderModel.limit((page - 1) * 20 if page == 1 else (page - 1) * 20 + 1, page * 20 + 1, '-number')
+        try:
+            orders, next_cursor = OrderModel.paginate(cursor=cursor, size=page_size(limit), order_by='-number')
+        except InvalidCursor as e:
+            return invalid_cursor(e, locale)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
     return order_list_schema.dump(orders)
 
 
@@ -119,7 +137,7 @@ async def update_order(payload: dict, _id: OID, locale: Optional[str] = Cookie('
 
 
 @router.post("/orders/generate-invoice",
-             status_code=status.HTTP_201_CREATED,
+             status_code=status.HTTP_202_ACCEPTED,
              responses={
                  422: {
                      "model": OutputError,
@@ -135,10 +153,7 @@ async def create_invoice(payload: dict, locale: Optional[str] = Cookie('pt'),
         payment = PaymentModel.get_by_custom_field('order', payload.get('id'))
         if not payment:
             raise PaymentNotFound
-        generate_invoice(order, payment, order.user.preferred_language)
-        order.is_invoice_generated = True
-        order.last_updated_at_invoice = datetime.now()
-        order.save()
+        queue_invoice(order, payment)
     except OrderNotFound:
         return JSONResponse(status_code=status.HTTP_404_NOT_FOUND,
                             content={
@@ -149,9 +164,10 @@ async def create_invoice(payload: dict, locale: Optional[str] = Cookie('pt'),
                             content={
                                 "message": "Pagamento não encontrado." if locale == 'pt' else
                                 "Payment not found."})
-    return JSONResponse(status_code=status.HTTP_200_OK, content={'message': 'Fatura gerada com sucesso.'
+    # GET /orders/invoices/{_id}/status reports when the PDF is ready
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={'message': 'Fatura em geração.'
     if locale == 'pt' else
-    'Invoice created successfully.'})
+    'Invoice is being generated.', 'status': 'queued'})
 
 
 @router.post("/orders/send-invoice",
@@ -187,6 +203,28 @@ async def email_invoice(payload: dict, locale: Optional[str] = Cookie('pt'),
     'Email sent successfully.'})
 
 
+@router.get("/orders/invoices/export", status_code=status.HTTP_200_OK,
+            responses={
+                422: {
+                    "model": OutputError,
+                    "description": "Validation Error"
+                }
+            })
+async def export_invoices_zip(start: datetime, end: datetime, order_status: Optional[str] = None,
+                              current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
+    # Declared before /orders/invoices/{_id}, 'export' would be taken for an id
+    payload = {'updated_at__gte': start, 'updated_at__lt': end}
+    if order_status:
+        payload['status'] = order_status
+    orders = sorted(await find(OrderModel, payload), key=lambda order: order.number)
+    # The raw reference, payment.order would load every order again
+    payments = {str(reference_id(payment._data.get('order'))): payment
+                for payment in await find(PaymentModel, {'order__in': [order.id for order in orders]})}
+    return StreamingResponse(export_invoices(orders, payments), media_type='application/zip', headers={
+        'Content-Disposition': f'attachment; filename="invoices_{start:%Y%m%d}_{end:%Y%m%d}.zip"'
+    })
+
+
 @router.get("/orders/invoices/{_id}", status_code=status.HTTP_200_OK,
             responses={
                 422: {
@@ -196,3 +234,26 @@ async def email_invoice(payload: dict, locale: Optional[str] = Cookie('pt'),
             })
 async def get_invoice(_id: OID, current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
     return FileResponse(join(getcwd(), "invoice/invoices/", f"{_id}.pdf"))
+
+
+@router.get("/orders/invoices/{_id}/status", status_code=status.HTTP_200_OK,
+            responses={
+                422: {
+                    "model": OutputError,
+                    "description": "Validation Error"
+                }
+            })
+async def get_invoice_status(_id: OID, locale: Optional[str] = Cookie('pt'),
+                             current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
+    order = await get_one(OrderModel, {'id': _id})
+    if not order:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND,
+                            content={
+                                "message": "Ordem não encontrada." if locale == 'pt' else
+                                "Order not found."})
+    await expire_invoice_job(order)
+    return {'status': order.invoice_status or ('done' if order.is_invoice_generated else ''),
+            'is_invoice_generated': order.is_invoice_generated,
+            'last_updated_at_invoice': order.last_updated_at_invoice,
+            'invoice_number': order.invoice_number,
+            'error': order.invoice_error}
@@ -1,11 +1,14 @@
 from typing import Optional, Union
-from fastapi import APIRouter, status, Cookie, UploadFile, File, Security
+from fastapi import APIRouter, status, Cookie, Security, Request
 
-from exceptions import OutputError, ProductNotFound, ProductNotUnique
+from exceptions import OutputError, ProductNotFound, ProductNotUnique, InvalidCursor
+from helpers.cache import catalog_cache
+from helpers.db_helper_async import get_all
+from helpers.snapshot import Snapshot
 from models import ProductModel
 from models.base import OID
 from models.user import UserModel
-from resources.base import creator, updater, getter, deleter, uploader
+from resources.base import creator, updater, getter, deleter, uploader, page_size, invalid_cursor
 from schemas.product import ProductSchema
 
 router = APIRouter(
@@ -23,12 +26,29 @@ product_list_schema = ProductSchema(many=True)
                     "description": "Validation Error"
                 }
             })
-async def get_products_by_category(category: Union[OID, str] = None, locale: Optional[str] = Cookie('pt')):
-    if category:
-        products = ProductModel.get_by_category(category)
-    else:
-        products = ProductModel.get_all()
-    return product_list_schema.dump(products)
+async def get_products_by_category(request: Request, category: Union[OID, str] = None,
+                                   cursor: Optional[str] = None, limit: Optional[int] = None,
+                                   locale: Optional[str] = Cookie('pt')):
+    async def load():
+        if cursor or limit:
+            payload = ProductModel.category_filter(category) if category else {}
+            if payload is None:
+                return Snapshot.from_data([])
+            products, next_cursor = ProductModel.paginate(payload, cursor, page_size(limit), order_by='name')
+            return Snapshot.from_data(product_list_schema.dump(products),
+                                      headers={'X-Next-Cursor': next_cursor} if next_cursor else None)
+        if category:
+            products = ProductModel.get_by_category(category)
+        else:
+            products = await get_all(ProductModel)
+        return Snapshot.from_data(product_list_schema.dump(products))
+
+    key = ('products', str(category) if category else None, cursor, page_size(limit) if cursor or limit else None)
+    try:
+        snapshot = await catalog_cache.get_or_load(key, load)
+    except InvalidCursor as e:
+        return invalid_cursor(e, locale)
+    return snapshot.response(request)
 
 
 @router.get("/products/{_id}", status_code=status.HTTP_200_OK,
@@ -64,9 +84,10 @@ async def create_product(product: dict, locale: Optional[str] = Cookie('pt'),
                      "description": "Validation Error"
                  }
              })
-async def create_upload_file(_id: OID, file: UploadFile = File(...),
-                             current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
-    return await uploader(ProductModel, 'products', _id, file)
+async def create_upload_file(_id: OID, request: Request,
+                             current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"]),
+                             locale: Optional[str] = Cookie('pt')):
+    return await uploader(ProductModel, _id, request, locale=locale)
 
 
 @router.post("/products/{_id}/{attr_name}/{option_name}/upload",
@@ -77,9 +98,10 @@ async def create_upload_file(_id: OID, file: UploadFile = File(...),
                      "description": "Validation Error"
                  }
              })
-async def create_upload_file(_id: OID, attr_name: str, option_name: str, file: UploadFile = File(...),
-                             current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
-    return await uploader(ProductModel, 'products', _id, file, attr_name=attr_name, option_name=option_name)
+async def create_upload_file(_id: OID, attr_name: str, option_name: str, request: Request,
+                             current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"]),
+                             locale: Optional[str] = Cookie('pt')):
+    return await uploader(ProductModel, _id, request, attr_name=attr_name, option_name=option_name, locale=locale)
 
 
 @router.patch("/products/{_id}", status_code=status.HTTP_200_OK,
@@ -1,9 +1,12 @@
 from typing import Optional, Union, List, Any
 
 from bson import ObjectId
-from fastapi import APIRouter, status, Cookie
+from fastapi import APIRouter, status, Cookie, Request
 
 from exceptions import OutputError, ProductTypeNotFound, ProductTypeNotUnique
+from helpers.cache import catalog_cache
+from helpers.db_helper_async import get_all
+from helpers.snapshot import Snapshot
 from models.base import OID
 from models.product_type import ProductTypeModel
 from resources.base import creator, updater, getter, deleter
@@ -25,12 +28,17 @@ product_type_list_schema = ProductTypeSchema(many=True)
                     "description": "Validation Error"
                 }
             })
-async def get_product_types(locale: Optional[str] = Cookie('pt'), by_name: int = 0):
-    product_types: Union[List[ProductTypeModel], list[dict[str, Union[str, Any]]]] = ProductTypeModel.get_all()
-    if by_name:
-        product_types = [{'name': product_type.name,
-                          'id': product_type.id} for product_type in product_types]
-    return product_type_list_schema.dump(product_types)
+async def get_product_types(request: Request, locale: Optional[str] = Cookie('pt'), by_name: int = 0):
+    async def load():
+        product_types: Union[List[ProductTypeModel], list[dict[str, Union[str, Any]]]] = \
+            await get_all(ProductTypeModel)
+        if by_name:
+            product_types = [{'name': product_type.name,
+                              'id': product_type.id} for product_type in product_types]
+        return Snapshot.from_data(product_type_list_schema.dump(product_types))
+
+    snapshot = await catalog_cache.get_or_load(('product_types', bool(by_name)), load)
+    return snapshot.response(request)
 
 
 @router.get("/product-types/{_id}", status_code=status.HTTP_200_OK,
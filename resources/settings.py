@@ -1,4 +1,6 @@
-from fastapi import APIRouter, status, Security, UploadFile, File
+from typing import Optional
+
+from fastapi import APIRouter, status, Security, Cookie, Request
 
 from exceptions import OutputError
 from models import UserModel
@@ -48,9 +50,10 @@ async def patch_settings(payload: dict):
                      "description": "Validation Error"
                  }
              })
-async def update_settings(is_video: bool = False, file: UploadFile = File(...),
-                          current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
-    return await settings_uploader(file, settings_video=is_video)
+async def update_settings(request: Request, is_video: bool = False,
+                          current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"]),
+                          locale: Optional[str] = Cookie('pt')):
+    return await settings_uploader(request, settings_video=is_video, locale=locale)
 
 
 @router.delete("/settings", status_code=status.HTTP_200_OK,
@@ -1,19 +1,19 @@
 from datetime import timedelta
 from typing import Optional
 
-from fastapi import APIRouter, status, Cookie, Depends, HTTPException, Security
+from fastapi import APIRouter, status, Cookie, Depends, HTTPException, Security, Response
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
 from auth import Token, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from exceptions import OutputError, UserNotUnique, UserNotFound, Error
+from exceptions import OutputError, UserNotUnique, UserNotFound, Error, InvalidCursor
 from languages.errors.messages import translations
 from languages.general_messages.messages import general_messages
 from models.base import OID
 from models.user import UserModel
-from resources.base import creator, updater, getter
+from resources.base import creator, updater, getter, page_size, invalid_cursor
 from resources.order import order_schema
-from schemas.user import UserSchema, UserDashboardSchema
+from schemas.user import UserSchema, UserDashboardSchema, order_history
 
 router = APIRouter(
     tags=["users"],
@@ -25,7 +25,7 @@ user_list_schema = UserDashboardSchema(many=True)
 
 
 async def helper_login(form_data, locale: Optional[str], dashboard=False):
-    user = UserModel.authenticate_user(form_data.username, form_data.password)
+    user = await UserModel.authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -56,7 +56,7 @@ async def add_update_item(item: dict, user, locale: str, function=None):
             raise UserNotFound
 
         await getattr(user, function)(item)
-        return user_schema.dump(user)
+        return user_schema.dump(user.document)
     except UserNotFound as e:
         e.msg_template = translations.get(locale).get(e.code) if translations.get(locale).get(e.code) \
             else e.msg_template
@@ -91,12 +91,12 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 
 @router.get("/dashboard/me")
 async def read_users_me(current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
-    return user_dashboard_schema.dump(current_user)
+    return user_dashboard_schema.dump(current_user.document)
 
 
 @router.get("/users/me")
 async def get_me(current_user: UserModel = Depends(UserModel.get_current_user)):
-    return user_schema.dump(current_user)
+    return user_schema.dump(current_user.document)
 
 
 @router.get("/users/me/orders/last")
@@ -105,9 +105,15 @@ async def get_last_order(current_user: UserModel = Depends(UserModel.get_current
 
 
 @router.get("/users/me/orders")
-async def get_me(current_user: UserModel = Depends(UserModel.get_current_user)):
-    user_schema.context['orders'] = True
-    return user_schema.dump(current_user)
+async def get_me(cursor: Optional[str] = None, limit: Optional[int] = None,
+                 current_user: UserModel = Depends(UserModel.get_current_user), locale: Optional[str] = Cookie('pt')):
+    try:
+        orders, next_cursor = order_history(current_user.id, cursor, page_size(limit))
+    except InvalidCursor as e:
+        return invalid_cursor(e, locale)
+    out_data = user_schema.dump(current_user.document)
+    out_data['orders_out'], out_data['next_cursor'] = orders, next_cursor
+    return out_data
 
 
 @router.get("/users/{_id}",
@@ -131,8 +137,18 @@ async def get_user(_id: OID, current_user: UserModel = Security(UserModel.get_cu
                     "description": "Validation Error"
                 }
             })
-async def get_users(current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"])):
-    return user_list_schema.dump(UserModel.get_all())
+async def get_users(response: Response, cursor: Optional[str] = None, limit: Optional[int] = None,
+                    current_user: UserModel = Security(UserModel.get_current_user, scopes=["superuser"]),
+                    locale: Optional[str] = Cookie('pt')):
+    if not cursor and not limit:
+        return user_list_schema.dump(UserModel.get_all())
+    try:
+        users, next_cursor = UserModel.paginate(cursor=cursor, size=page_size(limit))
+    except InvalidCursor as e:
+        return invalid_cursor(e, locale)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return user_list_schema.dump(users)
 
 
 @router.patch("/users/{_id}",
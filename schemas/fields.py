@@ -0,0 +1,38 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from marshmallow import fields, missing, ValidationError
+
+from helpers.db_helper_v2 import reference_id
+
+
+class ReferenceId(fields.Field):
+    """
+    Reference (or list of references) dumped as the id of the referenced document.
+    The value is read from the raw document data, so dumping never dereferences (one query per document).
+    """
+
+    def get_value(self, obj, attr, accessor=None, default=missing):
+        data = getattr(obj, '_data', None)
+        if data is None:
+            return super().get_value(obj, attr, accessor, default)
+        value = data.get(attr)
+        return missing if value is None else value
+
+    @staticmethod
+    def to_id(value):
+        return str(reference_id(value))
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        if isinstance(value, (list, tuple)):
+            return [self.to_id(v) for v in value]
+        return self.to_id(value)
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            if isinstance(value, (list, tuple)):
+                return [ObjectId(str(v)) for v in value]
+            return ObjectId(str(value))
+        except InvalidId:
+            raise ValidationError('Not a valid ObjectId.')
@@ -1,7 +1,21 @@
-from marshmallow import post_dump
+from marshmallow import post_dump, post_load, Schema, fields
+from marshmallow.fields import Nested
 from marshmallow_mongoengine import ModelSchema
 
+from helpers.db_helper_v2 import in_bulk
 from models import OrderModel, UserModel, ProductModel
+from models.user import CartItem
+from schemas.fields import ReferenceId
+
+
+class CartItemSchema(Schema):
+    product = ReferenceId()
+    attributes = fields.List(fields.Dict())
+    quantity = fields.Integer()
+
+    @post_load
+    def make_item(self, data, **kwargs):
+        return CartItem(**data)
 
 
 class OrderSchema(ModelSchema):
@@ -10,20 +24,31 @@ class OrderSchema(ModelSchema):
     class Meta:
         model = OrderModel
 
-    @post_dump
-    def convert_user_id(self, out_data, **kwargs):
-        user = UserModel.get_by_id(out_data.get("user"))
-        shipping_address = out_data.get('shipping_address')
-        out_shipping_address = {}
-        # for k in shipping_address._fields.keys():
-        #     out_shipping_address.update({k: getattr(shipping_address, k)})
-        out_data['user'] = {'name': f'{user.first_name} {user.last_name}',
-                            'email': user.email,
-                            'shipping_address': shipping_address}
-
-        if not kwargs.get('many'):
-            for item in out_data.get('items'):
-                product = ProductModel.get_by_id(item.get('product'))
+    user = ReferenceId()
+    items = Nested(CartItemSchema, many=True)
+
+    @post_dump(pass_many=True)
+    def convert_user_id(self, data, many, **kwargs):
+        # Users (and products, for a single order) are loaded once for the whole dump
+        orders = data if many else [data]
+        users = in_bulk(UserModel, [out_data.get('user') for out_data in orders],
+                        fields=('first_name', 'last_name', 'email'))
+        products = {} if many else in_bulk(ProductModel, [item.get('product') for item in data.get('items', [])],
+                                           fields=('image', 'name', 'price', 'currency'))
+        for out_data in orders:
+            user = users.get(out_data.get('user'))
+            shipping_address = out_data.get('shipping_address')
+            # for k in shipping_address._fields.keys():
+            #     out_shipping_address.update({k: getattr(shipping_address, k)})
+            out_data['user'] = {'name': f'{user.first_name} {user.last_name}' if user else '',
+                                'email': user.email if user else '',
+                                'shipping_address': shipping_address}
+
+        if not many:
+            for item in data.get('items', []):
+                product = products.get(item.get('product'))
+                if not product:
+                    continue
                 item['out_product'] = {
                     'image': product.image,
                     'name': product.name,
@@ -31,4 +56,4 @@ class OrderSchema(ModelSchema):
                     'currency': product.currency,
                 }
                 item['total'] = product.price * item.get('quantity')
-        return out_data
+        return data
@@ -1,43 +1,61 @@
+from typing import Optional, Tuple, List
+
 from marshmallow import post_dump
 from marshmallow_mongoengine import ModelSchema
 
+from helpers.db_helper_v2 import paginate
 from models import OrderModel
 from models.user import UserModel
+from schemas.fields import ReferenceId
+
+history_fields = ('id', 'number', 'updated_at', 'status', 'amount', 'currency', 'shipped', 'shipping_cost',
+                  'shipping_address', 'billing_address', 'payment_method', 'mb_reference', 'items')
 
 
-def helper_builder(order):
-    order_object = OrderModel.get_by_id(order)
-    number_of_items = 0
-    for item in order_object.items:
-        number_of_items += item.quantity
+def helper_builder(order: dict):
+    # order is the raw document, products are kept as ids so nothing is dereferenced
+    items = order.get('items', [])
     return {
-        'id': str(order_object.id),
-        'number': order_object.number,
-        'updated_at': order_object.updated_at,
-        'status': order_object.status,
-        'amount': order_object.amount,
-        'currency': order_object.currency,
-        'shipped': order_object.shipped,
-        'number_of_items': number_of_items,
-        'shipping_cost': order_object.shipping_cost,
-        'shipping_address': order_object.shipping_address,
-        'billing_address': order_object.billing_address,
-        'payment_method': order_object.payment_method,
-        'mb_reference': order_object.mb_reference if 'mb_reference' in order_object else None,
+        'id': str(order.get('_id')),
+        'number': order.get('number'),
+        'updated_at': order.get('updated_at'),
+        'status': order.get('status'),
+        'amount': order.get('amount'),
+        'currency': order.get('currency'),
+        'shipped': order.get('shipped'),
+        'number_of_items': sum(item.get('quantity', 1) for item in items),
+        'shipping_cost': order.get('shipping_cost'),
+        'shipping_address': order.get('shipping_address'),
+        'billing_address': order.get('billing_address'),
+        'payment_method': order.get('payment_method'),
+        'mb_reference': order.get('mb_reference'),
         'items': [{
-            'product': str(item.product.id),
-            'attributes': item.attributes,
-            'quantity': item.quantity,
-        } for item in order_object.items],
+            'product': str(item.get('product')),
+            'attributes': item.get('attributes', []),
+            'quantity': item.get('quantity', 1),
+        } for item in items],
     }
 
 
+def order_history(user_id, cursor: str = None, size: int = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Newest first order history of a user, read with one projected query over the orders collection.
+    With a size, returns at most that many orders and the cursor of the next page (None on the last one).
+    A cursor that doesn't decode raises InvalidCursor instead of starting over from the first page.
+    """
+    if size:
+        orders, next_cursor = paginate(OrderModel, {'user': user_id}, cursor, size, order_by='-id',
+                                       fields=history_fields, as_pymongo=True)
+    else:
+        orders, next_cursor = OrderModel.objects(user=user_id).only(*history_fields).order_by('-id').as_pymongo(), None
+    return [helper_builder(order) for order in orders], next_cursor
+
+
 def unwrap_orders(out_data, **kwargs):
     if not kwargs.get('many'):
         orders = []
-        if 'orders' in out_data:
-            for order in reversed(out_data.get('orders')):
-                orders.append(helper_builder(order))
+        if out_data.get('orders'):
+            orders, _ = order_history(out_data.get('id'))
         out_data['orders_out'] = orders
     return out_data
 
@@ -50,6 +68,8 @@ class UserSchema(ModelSchema):
         load_only = ('password',)
         dump_only = ('id', 'cart', 'role')
 
+    orders = ReferenceId(dump_only=True)
+
     @post_dump
     def post_dump(self, out_data, **kwargs):
         if 'cart' not in out_data:
@@ -68,6 +88,8 @@ class UserDashboardSchema(ModelSchema):
         load_only = ('password',)
         dump_only = ('id', 'cart')
 
+    orders = ReferenceId(dump_only=True)
+
     @post_dump
     def post_dump(self, out_data, **kwargs):
         return unwrap_orders(out_data, **kwargs)
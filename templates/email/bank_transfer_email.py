@@ -1,3 +1,6 @@
+from config import IBAN
+from templates.registry import FormatTemplate
+
 translations = {
     'pt': {
         'greeting': 'Olá {}',
@@ -220,4 +223,14 @@ html = '''
 </table>
 </body>
 </html>
-'''
\ No newline at end of file
+'''
+
+# Everything but the order values is filled in once per language
+templates = {
+    locale: FormatTemplate(html, {
+        'line_1': strings.get('line_1'),
+        'amount': strings.get('amount'),
+        'button_label': strings.get('button_label'),
+        'iban': IBAN,
+    }) for locale, strings in translations.items()
+}
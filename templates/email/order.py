@@ -1,22 +1,10 @@
-from calendar import month_name
-from locale import setlocale, LC_ALL
 from os import getenv
 
-from jinja2 import Template
-
 from config import from_email, domain
+from helpers import get_image_from_cart, send_email
 from models import OrderModel, PaymentModel
 from models.base import OID
-
-mapping = {
-    'pt': 'pt_PT',
-    'en-US': 'en_US'
-}
-
-currencies = {
-    'eur': '€',
-    'usd': '$'
-}
+from templates.registry import localized, get_date, currencies, LocalizedTemplate
 
 translations = {
     'pt': {
@@ -101,31 +89,30 @@ translations = {
 }
 
 
-def get_date(date, locale):
-    setlocale(LC_ALL, mapping.get(locale))
-    date_now = date
-    return f'{month_name[date_now.month].capitalize()} {date_now.day}, {date_now.year}'
+order_templates = localized('templates/email/order.html', {
+    locale: {
+        'translations': strings,
+        'currencies': currencies,
+        'get_image': get_image_from_cart,
+        'domain': domain if getenv('ENVIRONMENT') == 'prod' else 'localhost:8080',
+        'order_url': 'http://{}/user/order_history?order_id={}' if getenv('ENVIRONMENT') == 'dev'
+        else 'https://{}/user/order_history?order_id={}',
+        'support_email': from_email
+    } for locale, strings in translations.items()
+})
 
 
 def send_order_email(order, payment, p="templates/email/order.html"):
-    from helpers import get_image_from_cart, send_email
-    with open(p, encoding="utf-8") as html_template:
-        html = html_template.read()
-        temp = Template(html)
     # Render Jinja blocks
     language = order.user.preferred_language
-    out = temp.render(
+    template = order_templates.get(language)
+    if p != template.name:
+        template = LocalizedTemplate(p, template.fragments)
+    out = template.render(
         user=order.user,
         order=order,
         payment_method=translations.get(language).get(payment.method),
-        translations=translations.get(language),
         date=get_date(order.updated_at, language),
-        currencies=currencies,
-        get_image=get_image_from_cart,
-        domain=domain if getenv('ENVIRONMENT') == 'prod' else 'localhost:8080',
-        order_url='http://{}/user/order_history?order_id={}' if getenv('ENVIRONMENT') == 'dev'
-        else 'https://{}/user/order_history?order_id={}',
-        support_email=from_email
     )
     # with open("out.html", 'w') as f:
     #     f.write(out)
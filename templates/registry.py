@@ -0,0 +1,101 @@
+from calendar import month_name
+from locale import setlocale, getlocale, LC_TIME, Error as LocaleError
+from os import getenv, makedirs
+from string import Formatter
+from threading import Lock
+from typing import Dict, List
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template
+
+from config import template_cache_dir
+
+mapping = {
+    'pt': 'pt_PT',
+    'en-US': 'en_US'
+}
+
+currencies = {
+    'eur': '€',
+    'usd': '$'
+}
+
+makedirs(template_cache_dir, exist_ok=True)
+
+# Templates are compiled once per process (and the bytecode kept on disk for the next start),
+# only in dev a change on disk is picked up
+environment = Environment(
+    loader=FileSystemLoader('.'),
+    bytecode_cache=FileSystemBytecodeCache(template_cache_dir),
+    auto_reload=getenv('ENVIRONMENT') == 'dev',
+)
+
+month_names: Dict[str, List[str]] = {}
+month_names_lock = Lock()
+
+
+def get_month_names(locale: str) -> List[str]:
+    """Month names of a language, read once from the system locale."""
+    if locale not in month_names:
+        with month_names_lock:
+            previous = getlocale(LC_TIME)
+            try:
+                setlocale(LC_TIME, mapping.get(locale))
+                month_names[locale] = [name.capitalize() for name in month_name]
+            except LocaleError:
+                month_names[locale] = list(month_name)
+            finally:
+                setlocale(LC_TIME, previous)
+    return month_names.get(locale)
+
+
+def get_date(date, locale) -> str:
+    return f'{get_month_names(locale)[date.month]} {date.day}, {date.year}'
+
+
+class LocalizedTemplate:
+    """A template bound to the values that only depend on the language, render takes the per call ones."""
+
+    def __init__(self, name: str, fragments: dict):
+        self.name = name
+        self.fragments = fragments
+
+    @property
+    def template(self) -> Template:
+        # Cached by the environment, not read nor compiled again
+        return environment.get_template(self.name)
+
+    def render(self, **variables) -> str:
+        return self.template.render(self.fragments, **variables)
+
+
+class FormatTemplate:
+    """
+    A str.format template split once into its parts, the fields found in fragments are filled in ahead,
+    render only joins the per call values.
+    """
+
+    def __init__(self, source: str, fragments: dict):
+        self.parts = []
+        for literal, name, spec, conversion in Formatter().parse(source):
+            if literal:
+                self.add(literal)
+            if name is None:
+                continue
+            if name in fragments:
+                self.add(format(fragments.get(name), spec or ''))
+            else:
+                self.parts.append((None, name))
+
+    def add(self, text: str):
+        if self.parts and self.parts[-1][1] is None:
+            self.parts[-1] = (self.parts[-1][0] + text, None)
+        else:
+            self.parts.append((text, None))
+
+    def render(self, **values) -> str:
+        return ''.join(text if name is None else str(values.get(name)) for text, name in self.parts)
+
+
+def localized(name: str, fragments: Dict[str, dict]) -> Dict[str, LocalizedTemplate]:
+    """One LocalizedTemplate per language, fragments maps the language prefix to its values."""
+    return {locale: LocalizedTemplate(name, values) for locale, values in fragments.items()}
@@ -11,7 +11,9 @@ from languages import languages
 from models import ProductModel, UserModel, OrderModel, PaymentModel
 from models.attribute import AttributeModel
 from models.category import CategoryModel
-from models.language import Language
+from models.indexes import index_report, ensure_indexes
+from models.language import Language, TranslationModel
+from models.media import MediaModel
 from models.product_type import ProductTypeModel
 from resources.attribute import attribute_schema
 from resources.base import translations_helper, creator
@@ -388,6 +390,7 @@ async def clear():
             remove(f"languages/{lang.prefix}.json")
         lang.save()
         languages.clear()
+    TranslationModel.objects.delete()
         # print(get_text('en-US', 'test'))
 
     print('\nClearing static folder:')
@@ -397,10 +400,26 @@ async def clear():
             rmtree(internal_dir)
 
 
+def indexes():
+    print('\nIndexes:')
+    for collection, report in index_report().items():
+        print(f"{collection}: missing {report.get('missing')}, not declared {report.get('extra')}, "
+              f"unused {report.get('unused')}")
+
+
 if __name__ == '__main__':
     loop = asyncio.get_event_loop()
     if argv[1] == 'populate':
         loop.run_until_complete(populate())
     elif argv[1] == 'clear':
         loop.run_until_complete(clear())
+    elif argv[1] == 'indexes':
+        indexes()
+    elif argv[1] == 'media-gc':
+        MediaModel.recount()
+        for path in MediaModel.collect_garbage():
+            print(f"{path} removed.")
+    elif argv[1] == 'ensure-indexes':
+        ensure_indexes()
+        indexes()
     loop.close()